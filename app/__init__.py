@@ -5,6 +5,7 @@ from flask_migrate import Migrate
 from app.config import Config
 from datetime import datetime
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -20,6 +21,11 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
+    # Trust X-Forwarded-* only from the configured number of proxies
+    proxies = app.config.get('TRUSTED_PROXIES')
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+    
     # Initialize extensions with app
     db.init_app(app)
     login_manager.init_app(app)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -28,6 +29,107 @@ class Config:
     # Use S3 for file uploads (set to False for local development)
     USE_S3 = os.environ.get('USE_S3', 'True').lower() == 'true'
     
+    # S3 client tuning; the client is created once per process (see s3_helper.py)
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # e.g. a MinIO server
+    S3_LOCAL_ROOT = os.environ.get('S3_LOCAL_ROOT')  # store "S3" objects in this directory instead
+    S3_MAX_POOL_CONNECTIONS = 20
+    S3_CONNECT_TIMEOUT = 5
+    S3_READ_TIMEOUT = 30
+    S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024  # bytes; larger uploads are split into parts
+    S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+    S3_TRANSFER_CONCURRENCY = 4  # parts uploaded in parallel
+    
+    # Where uploads are stored: 's3', 'local' (static folder) or 'memory' (tests);
+    # defaults to 's3' when USE_S3 is set, otherwise 'local'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND')
+    STORAGE_ASYNC_DELETE = True  # delete replaced/removed files off the request thread
+    
+    # Uploaded images are staged and resized in the background (see
+    # app/utils/image_pipeline.py); set False to process them in the request
+    IMAGE_PIPELINE_ASYNC = os.environ.get('IMAGE_PIPELINE_ASYNC', 'True').lower() == 'true'
+    IMAGE_STAGING_DIR = os.environ.get('IMAGE_STAGING_DIR', os.path.join(tempfile.gettempdir(), 'hesa-image-staging'))
+    IMAGE_WORKERS = 2  # processes resizing images, per worker
+    IMAGE_UPLOAD_THREADS = 2  # threads pushing results to storage
+    IMAGE_WIDTHS = (320, 640, 960)  # srcset widths generated below the full-size copy
+    IMAGE_FORMATS = ('WEBP', 'AVIF')  # modern formats to generate, if Pillow supports them
+    # Assets still pending after this many seconds (their worker restarted) are
+    # processed again from the staged original, or marked failed if it's gone;
+    # each worker checks every IMAGE_RECOVERY_INTERVAL seconds
+    IMAGE_PENDING_TIMEOUT = 600
+    IMAGE_RECOVERY_INTERVAL = 60
+    
+    # Upper bound (seconds) on how stale another worker's /api/buses snapshot can be
+    BUS_SNAPSHOT_TTL = 2
+    
+    # Live bus push channel (/api/buses/stream and /api/buses/poll), in seconds
+    BUS_STREAM_HEARTBEAT = 15  # keep-alive comment when nothing has been sent
+    BUS_STREAM_RESYNC = 5  # how often to check for changes made by other workers
+    BUS_STREAM_MAX_AGE = 300  # close streams periodically; EventSource reconnects
+    BUS_LONG_POLL_TIMEOUT = 25
+    
+    # Batched driver location uploads (/driver/update_location/<id>/batch)
+    LOCATION_BATCH_MAX = 500  # fixes per request
+    LOCATION_MAX_CLOCK_SKEW = 60  # seconds a fix may be ahead of the server clock
+    
+    # Driver positions are kept in memory and written to BusLocation in bulk
+    # every LOCATION_FLUSH_INTERVAL seconds; set False to commit every ping
+    LOCATION_WRITE_BEHIND = os.environ.get('LOCATION_WRITE_BEHIND', 'True').lower() == 'true'
+    LOCATION_FLUSH_INTERVAL = 5
+    POSITION_HISTORY_DAYS = 30  # whole days of bus tracks to keep
+    TRACK_MAX_WINDOW = 24 * 3600  # longest replay window, in seconds
+    
+    # Stop arrival predictions (/api/stops/<id>/arrivals)
+    ETA_DEFAULT_SPEED = 6.0  # m/s assumed for segments without history
+    ETA_STOP_DWELL = 20  # seconds spent at each stop
+    ETA_MAX_OFF_ROUTE = 150  # meters a bus may be from its route and still count
+    ETA_TABLE_TTL = 300  # seconds before route/stop tables are reloaded
+    ETA_HISTORY_DAYS = 7  # history used by build_eta_tables.py
+    ETA_CACHE_SECONDS = 5
+    
+    # Paystack; without a secret key payments are treated as successful (demo mode)
+    PAYSTACK_SECRET_KEY = os.environ.get('PAYSTACK_SECRET_KEY')
+    PAYSTACK_API_URL = 'https://api.paystack.co'
+    PAYSTACK_TIMEOUT = 10
+    
+    # Background payment verification (see app/utils/verification.py)
+    VERIFY_WORKERS = 2  # worker threads per process
+    VERIFY_BATCH_SIZE = 50  # votes recorded per transaction
+    VERIFY_MAX_ATTEMPTS = 6  # gateway attempts before giving up (the webhook still applies)
+    VERIFY_RETRY_BASE = 2  # seconds; doubled after every failed attempt
+    VERIFY_RETRY_MAX = 300
+    # The queue is in memory; unverified votes from the last VERIFY_RECOVERY_WINDOW
+    # seconds are re-queued when it starts and every VERIFY_RECOVERY_INTERVAL seconds
+    VERIFY_RECOVERY_WINDOW = 86400
+    VERIFY_RECOVERY_INTERVAL = 300
+    
+    # Face of HESA leaderboard; seconds before each worker reloads vote totals
+    # (the stream shares BUS_STREAM_HEARTBEAT and BUS_STREAM_MAX_AGE)
+    LEADERBOARD_REFRESH = 5
+    
+    # Rendered page cache for anonymous visitors (see app/utils/cache.py)
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_TTL = 300
+    CACHE_TAG_CHECK_INTERVAL = 2  # seconds before other workers see an invalidation
+    COUNT_CACHE_TTL = 24 * 3600  # cached row counts; invalidated by tag on writes
+    GALLERY_PAGE_SIZE = 24  # photos per gallery page / infinite-scroll batch
+    
+    # Gallery likes are buffered per process and added to the database in one
+    # UPDATE every LIKE_FLUSH_INTERVAL seconds; set False to commit every like
+    LIKE_WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND', 'True').lower() == 'true'
+    LIKE_FLUSH_INTERVAL = 3
+    LIKE_BATCH_MAX = 100  # photo ids accepted per batch like request
+    # Repeat likes per IP address are dropped using a Bloom filter of
+    # 2 x LIKE_DEDUP_BITS bits (2 MB), forgotten after one to two windows
+    LIKE_DEDUP_BITS = 1 << 23
+    LIKE_DEDUP_HASHES = 7
+    LIKE_DEDUP_WINDOW = 24 * 3600  # seconds
+    # Reverse proxies in front of the app (e.g. 1 behind nginx or a platform
+    # router). When set, the client address, which likes are deduped on, and
+    # the scheme are taken from X-Forwarded-For / X-Forwarded-Proto; leave 0
+    # when clients connect directly, as the headers could then be forged
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    SETTINGS_CACHE_TTL = 300  # site settings; invalidated by tag when saved
+    
     # Remember me cookie duration
     REMEMBER_COOKIE_DURATION = timedelta(days=7)
     # Add this for cross-device access
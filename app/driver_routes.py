@@ -1,11 +1,15 @@
 # Create a new file called driver_routes.py
 
-from flask import Blueprint, render_template, url_for, flash, redirect, request, jsonify, abort
+from flask import Blueprint, render_template, url_for, flash, redirect, request, jsonify, abort, current_app
 from flask_login import login_required, current_user
 from app import db
 from app.models import BusLocation, User
 from app.forms import BusLocationForm
-from datetime import datetime
+from app.utils.bus_snapshot import publish_bus_update
+from app.utils.location_store import record_fixes, current_position
+from datetime import timezone
+import math
+import time
 
 # Create blueprint
 driver = Blueprint('driver', __name__, url_prefix='/driver')
@@ -39,6 +43,7 @@ def start_tracking(bus_id):
     # Update bus status to active
     bus.status = 'active'
     db.session.commit()
+    publish_bus_update(bus, current_user.username)
     
     return render_template('driver/tracking.html', bus=bus)
 
@@ -59,6 +64,7 @@ def stop_tracking(bus_id):
     # Update bus status to inactive
     bus.status = 'inactive'
     db.session.commit()
+    publish_bus_update(bus, current_user.username)
     
     flash('Bus tracking stopped successfully', 'success')
     return redirect(url_for('driver.dashboard'))
@@ -82,10 +88,90 @@ def update_location(bus_id):
         return jsonify({'success': False, 'error': 'Missing coordinates'}), 400
     
     try:
-        bus.latitude = float(data['latitude'])
-        bus.longitude = float(data['longitude'])
-        bus.last_update = datetime.utcnow()
-        db.session.commit()
+        record_fixes(bus, [(time.time(), float(data['latitude']), float(data['longitude']))])
+        publish_bus_update(bus, current_user.username)
         return jsonify({'success': True})
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def decode_fixes(data):
+    """
+    Decode a batch of location fixes sent by the tracking page.
+    Fixes can be sent plainly as `fixes: [{t, lat, lng}, ...]` or, with
+    `encoding: "delta"`, as an absolute first fix followed by
+    `[dt_ms, dlat_e5, dlng_e5]` offsets from the previous fix.
+    Timestamps are Unix epoch milliseconds.
+    :return: List of (timestamp_seconds, latitude, longitude) tuples
+    """
+    fixes = data.get('fixes')
+    if not isinstance(fixes, list) or not fixes:
+        raise ValueError('No fixes supplied')
+
+    decoded = []
+    if data.get('encoding') == 'delta':
+        first = fixes[0]
+        t, lat_e5, lng_e5 = int(first['t']), round(float(first['lat']) * 1e5), round(float(first['lng']) * 1e5)
+        decoded.append((t / 1000.0, lat_e5 / 1e5, lng_e5 / 1e5))
+        for dt, dlat, dlng in fixes[1:]:
+            t += int(dt)
+            lat_e5 += int(dlat)
+            lng_e5 += int(dlng)
+            decoded.append((t / 1000.0, lat_e5 / 1e5, lng_e5 / 1e5))
+    else:
+        for fix in fixes:
+            decoded.append((int(fix['t']) / 1000.0, float(fix['lat']), float(fix['lng'])))
+
+    for _, lat, lng in decoded:
+        if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError('Coordinates out of range')
+    return decoded
+
+@driver.route('/update_location/<int:bus_id>/batch', methods=['POST'])
+@login_required
+def update_location_batch(bus_id):
+    """Apply a buffered batch of fixes; only the newest one is written"""
+    if current_user.role != 'driver':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    
+    bus = BusLocation.query.get_or_404(bus_id)
+    
+    # Check if the bus is assigned to this driver
+    if bus.driver_id != current_user.id:
+        return jsonify({'success': False, 'error': 'Not assigned to this bus'}), 403
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    
+    # Checked on the raw list, before any work is spent decoding it
+    raw_fixes = data.get('fixes')
+    if isinstance(raw_fixes, list) and len(raw_fixes) > current_app.config['LOCATION_BATCH_MAX']:
+        return jsonify({'success': False, 'error': 'Too many fixes in one batch'}), 413
+    
+    try:
+        fixes = decode_fixes(data)
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        # OverflowError: JSON allows Infinity, which int() can't convert
+        return jsonify({'success': False, 'error': f'Invalid fixes: {e}'}), 400
+    
+    # Accept fixes strictly newer than what we already have, in order, and
+    # not from the future (allowing for a little clock skew on the phone)
+    # (last_update is a naive UTC datetime)
+    last_update = current_position(bus)[2]
+    newest = last_update.replace(tzinfo=timezone.utc).timestamp() if last_update else 0
+    latest_allowed = time.time() + current_app.config['LOCATION_MAX_CLOCK_SKEW']
+    accepted = []
+    for fix in fixes:
+        if newest < fix[0] <= latest_allowed:
+            accepted.append(fix)
+            newest = fix[0]
+    
+    if accepted:
+        record_fixes(bus, accepted)
+        publish_bus_update(bus, current_user.username)
+    
+    return jsonify({
+        'success': True,
+        'accepted': len(accepted),
+        'rejected': len(fixes) - len(accepted)
+    })
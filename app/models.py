@@ -35,19 +35,69 @@ class User(db.Model, UserMixin):
 # Update BusLocation model to include driver relationship
 class BusLocation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    bus_id = db.Column(db.String(20), nullable=False)
+    bus_id = db.Column(db.String(20), nullable=False, index=True)
     route = db.Column(db.String(100), nullable=False)
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     last_update = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='inactive')  # 'active', 'inactive', 'maintenance'
     # Add driver_id to link with the user who's driving the bus
-    driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     
     def __repr__(self):
         return f"BusLocation('{self.bus_id}', '{self.route}', '{self.last_update}')"
+
+class BusRoute(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)  # Matches BusLocation.route
+    path = db.Column(db.Text, nullable=False)  # Google encoded polyline of the route
+    is_loop = db.Column(db.Boolean, default=False)  # Path ends where it starts and buses go round
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    stops = db.relationship('BusStop', backref='route', lazy=True, order_by='BusStop.sequence',
+                            cascade="all, delete-orphan")
+    
+    def __repr__(self):
+        return f"BusRoute('{self.name}')"
+
+class BusStop(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    sequence = db.Column(db.Integer, nullable=False)  # Order of the stop along the route
+    # Typical seconds to reach this stop from the previous one (for the first
+    # stop of a loop: from the last stop). Precomputed from position history;
+    # None means no data yet and a default speed is assumed.
+    travel_seconds = db.Column(db.Integer, nullable=True)
+    
+    # Foreign keys
+    route_id = db.Column(db.Integer, db.ForeignKey('bus_route.id'), nullable=False)
+    
+    def __repr__(self):
+        return f"BusStop('{self.name}', {self.sequence})"
+
+class BusPositionHistory(db.Model):
+    # Append-only GPS track, one row per accepted fix. Kept deliberately
+    # compact: coordinates are stored as integers in 1e-5 degree units
+    # (~1 m), time as epoch seconds, and the (bus_pk, ts) primary key keeps
+    # each bus's track contiguous so a time window is a single range scan.
+    bus_pk = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)  # BusLocation.id
+    ts = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Unix epoch seconds
+    lat_e5 = db.Column(db.Integer, nullable=False)  # latitude * 1e5
+    lng_e5 = db.Column(db.Integer, nullable=False)  # longitude * 1e5
+    
+    def __repr__(self):
+        return f"BusPositionHistory({self.bus_pk}, {self.ts})"
     
 class BlogPost(db.Model):
+    __table_args__ = (
+        # Keyset pagination on the blog index walks this index in order
+        db.Index('ix_blog_post_date_posted_id', 'date_posted', 'id'),
+        db.Index('ix_blog_post_category_date_posted', 'category', 'date_posted'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -67,6 +117,10 @@ class BlogPost(db.Model):
         return f"BlogPost('{self.title}', '{self.date_posted}')"
 
 class Comment(db.Model):
+    __table_args__ = (
+        db.Index('ix_comment_post_id_date_posted', 'post_id', 'date_posted'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -106,6 +160,10 @@ class PersonalityOfTheWeek(db.Model):
         return f"PersonalityOfTheWeek('{self.name}', '{self.created_at}')"
 
 class PotwComment(db.Model):
+    __table_args__ = (
+        db.Index('ix_potw_comment_potw_id_date_posted', 'potw_id', 'date_posted'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     author_name = db.Column(db.String(50), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -122,7 +180,7 @@ class Event(db.Model):
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
     image_file = db.Column(db.String(256), nullable=True)
-    event_date = db.Column(db.DateTime, nullable=False)
+    event_date = db.Column(db.DateTime, nullable=False, index=True)
     location = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -131,6 +189,10 @@ class Event(db.Model):
 
 
 class HomeBanner(db.Model):
+    __table_args__ = (
+        db.Index('ix_home_banner_is_active_order', 'is_active', 'order'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -157,13 +219,23 @@ class GalleryCategory(db.Model):
         return f"GalleryCategory('{self.name}')"
 
 class GalleryPhoto(db.Model):
+    __table_args__ = (
+        # Public gallery listing: active photos by display order, newest first
+        db.Index('ix_gallery_photo_active_order', 'is_active', 'order',
+                 db.text('date_posted DESC'), db.text('id DESC')),
+        # The same, within one category (gallery filter buttons)
+        db.Index('ix_gallery_photo_category_order', 'category_id', 'is_active', 'order',
+                 db.text('date_posted DESC'), db.text('id DESC')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     image_file = db.Column(db.String(256), nullable=False)
-    date_posted = db.Column(db.DateTime, default=datetime.utcnow)
+    # Part of the gallery's cursor, so never NULL
+    date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
-    order = db.Column(db.Integer, default=0)
+    order = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     likes = db.Column(db.Integer, default=0)
     
     # Foreign key
@@ -174,6 +246,10 @@ class GalleryPhoto(db.Model):
     
 
 class FohContestant(db.Model):
+    __table_args__ = (
+        db.Index('ix_foh_contestant_is_active_votes', 'is_active', 'votes'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -184,13 +260,41 @@ class FohContestant(db.Model):
 
 class FohVote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    contestant_id = db.Column(db.Integer, db.ForeignKey('foh_contestant.id'), nullable=False)
+    contestant_id = db.Column(db.Integer, db.ForeignKey('foh_contestant.id'), nullable=False, index=True)
     email = db.Column(db.String(120), nullable=True)  # Optional voter email
     votes_count = db.Column(db.Integer, default=1)
     amount = db.Column(db.Float, nullable=False)  # Amount paid in GHS
-    transaction_ref = db.Column(db.String(255), nullable=False)  # Paystack reference
+    transaction_ref = db.Column(db.String(255), nullable=False, unique=True, index=True)  # Paystack reference
     verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship
-    contestant = db.relationship('FohContestant', backref='votes_received')
\ No newline at end of file
+    contestant = db.relationship('FohContestant', backref='votes_received')
+
+class CacheTag(db.Model):
+    # Version counter per cache tag; bumping it invalidates cached pages
+    # labelled with the tag in every worker process
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SiteSetting(db.Model):
+    # Runtime settings changed from the admin pages (voting open, vote cost, ...),
+    # stored as JSON so every worker process reads the same values
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ImageAsset(db.Model):
+    # An uploaded image and the state of its background processing. `key` is
+    # the value stored in the owning rows' image_file column (a filename or URL).
+    # Identical uploads share one asset, found by content_hash; ref_count is
+    # the number of rows using it, and its files are deleted when that hits 0
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(512), nullable=False, unique=True, index=True)
+    content_hash = db.Column(db.String(64), nullable=True, unique=True, index=True)  # SHA-256 of the upload
+    ref_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    folder = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, ready, failed
+    derivatives = db.Column(db.Text, nullable=True)  # JSON list of [width, content type, key]
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,16 +1,31 @@
-from flask import Blueprint, render_template, url_for, flash, redirect, request, jsonify, abort, current_app
+from flask import (Blueprint, render_template, url_for, flash, redirect, request, jsonify, abort, current_app,
+                   stream_with_context, get_template_attribute)
 from flask_login import login_user, current_user, logout_user, login_required
-from app import db
+from app import db, csrf
 from app.models import (User, BlogPost, Comment, PersonalityOfTheWeek, 
                         PotwComment, Event, BusLocation, HomeBanner, GalleryPhoto, GalleryCategory, FohContestant, FohVote)
 from app.forms import (AssignBusForm, RegistrationForm, LoginForm, BlogPostForm, CommentForm, 
                       PotwForm, PotwCommentForm, EventForm, BusLocationForm, HomeBannerForm, GalleryCategoryForm, 
                       GalleryPhotoForm, FohContestantForm, VoteForm)
-import os
+import json
+import math
 import secrets
-from PIL import Image
+import time
 from datetime import datetime
-from app.utils.s3_helper import upload_file_to_s3
+from app.utils.image_pipeline import image_pipeline, image_assets, image_sources
+from app.utils.storage import image_url
+from app.utils.bus_snapshot import get_bus_snapshot, invalidate_bus_snapshot, bus_channel
+from app.utils.broadcast import format_sse
+from app.utils.location_store import location_store
+from app.utils.position_history import iter_track, encode_polyline
+from app.utils.eta import eta_engine
+from app.utils.cache import cached_page, cache
+from app.utils.pagination import keyset_paginate, InvalidCursor
+from app.utils.likes import record_likes, like_counts
+from app.utils.paystack import valid_signature
+from app.utils.verification import verification_queue
+from app.utils.leaderboard import leaderboard, leaderboard_channel
+from app.utils.settings import get_setting, set_setting
 
 # Create blueprints
 main = Blueprint('main', __name__)
@@ -22,52 +37,43 @@ editor = Blueprint('editor', __name__, url_prefix='/editor')
 def save_image(form_image, folder='uploads'):
     """
     Save an uploaded image with a unique filename
-    Uses S3 if configured, otherwise saves locally
+    The original is staged and resized in the background, then stored
+    by the configured backend; returns the final image URL
     """
-    if current_app.config.get('USE_S3', False):
-        # Use S3 for file storage
-        file_url = upload_file_to_s3(form_image, folder=folder)
-        if file_url:
-            # Return the full URL for S3 images
-            return file_url
-        else:
-            # Fallback to local storage if S3 upload fails
-            print("S3 upload failed, falling back to local storage")
-            return save_image_locally(form_image, folder)
-    else:
-        # Use local storage
-        return save_image_locally(form_image, folder)
-
-# In your main routes file - update the save_image_locally function:
-
-def save_image_locally(form_image, folder='uploads'):
-    """Save an uploaded image with a unique filename to the local filesystem"""
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_image.filename)
-    picture_fn = random_hex + f_ext
-    folder_path = os.path.join('app', 'static', folder)
-    picture_path = os.path.join(folder_path, picture_fn)
-    
-    # Ensure directory exists
-    os.makedirs(folder_path, exist_ok=True)
-    
-    # Resize image with better quality settings
-    output_size = (1200, 900)  # Increased resolution
-    i = Image.open(form_image)
-    
-    # Use LANCZOS resampling for better quality
-    i.thumbnail(output_size, Image.Resampling.LANCZOS)
-    
-    # Save with high quality
-    if i.format == 'JPEG' or f_ext.lower() in ['.jpg', '.jpeg']:
-        i.save(picture_path, 'JPEG', quality=95, optimize=True)
-    elif i.format == 'PNG' or f_ext.lower() == '.png':
-        i.save(picture_path, 'PNG', optimize=True)
-    else:
-        # Default to JPEG with high quality
-        i.save(picture_path, 'JPEG', quality=95, optimize=True)
-    
-    return picture_fn
+    return image_pipeline.save(form_image, folder)
+
+def delete_image(image_file):
+    """Release a replaced or removed image; its files go once no other row uses them"""
+    if image_file:
+        image_pipeline.release(image_file)
+
+@main.app_template_global()
+def image_pending(image_path):
+    """True while an uploaded image is still being processed"""
+    asset = image_assets().get(image_path) if image_path else None
+    return asset is not None and asset[0] == 'pending'
+
+@main.app_template_global()
+def image_failed(image_path):
+    """True if an uploaded image couldn't be processed, so there is no file to show"""
+    asset = image_assets().get(image_path) if image_path else None
+    return asset is not None and asset[0] == 'failed'
+
+@main.app_template_global()
+def image_src(image_path, folder, default_image):
+    """
+    URL to show for an image where render_image can't be used (CSS
+    backgrounds, editor previews): the processing placeholder while it is
+    pending, the default image if it failed or is missing
+    """
+    if image_path and image_pending(image_path):
+        return url_for('static', filename='img/image-processing.svg')
+    if not image_path or image_failed(image_path):
+        return url_for('static', filename=default_image)
+    return image_url(image_path, folder)
+
+main.add_app_template_global(image_sources)
+main.add_app_template_global(image_url)
 
 
 # Main routes
@@ -77,6 +83,7 @@ def landing():
 
 
 @main.route('/home')
+@cached_page('events', 'potw', 'posts', 'banners', 'images')
 def home():
     events = Event.query.order_by(Event.event_date.desc()).limit(3).all()
     potw = PersonalityOfTheWeek.query.filter_by(is_active=True).first()
@@ -162,13 +169,23 @@ def logout():
 # Blog routes
 @blog.route('/')
 def index():
-    page = request.args.get('page', 1, type=int)
-    
     # Filter out posts with 'health' or 'event' category
-    posts = BlogPost.query \
-        .filter(BlogPost.category.notin_(['health', 'event'])) \
-        .order_by(BlogPost.date_posted.desc()) \
-        .paginate(page=page, per_page=9)
+    query = BlogPost.query.filter(BlogPost.category.notin_(['health', 'event']))
+    
+    # The total only changes when posts are created, edited or deleted
+    total = cache.get_or_set('count:blog.index', ['posts'], current_app.config['COUNT_CACHE_TTL'],
+                             query.count)
+    
+    # Cursor pagination on (date_posted, id) so deep pages don't scan with OFFSET
+    try:
+        posts = keyset_paginate(query,
+                                [(BlogPost.date_posted, True), (BlogPost.id, True)],
+                                per_page=9,
+                                after=request.args.get('after'),
+                                before=request.args.get('before'),
+                                total=total)
+    except InvalidCursor:
+        abort(400)
     
     return render_template('blog.html', posts=posts)
 
@@ -229,6 +246,7 @@ def new_post():
         )
         db.session.add(post)
         db.session.commit()
+        cache.invalidate('posts')
         flash('Your post has been created!', 'success')
         return redirect(url_for('editor.dashboard'))
     return render_template('create_post.html', form=form, title='New Post')
@@ -264,6 +282,7 @@ def new_potw():
         )
         db.session.add(personality)
         db.session.commit()
+        cache.invalidate('potw')
         flash('New Personality of the Week has been created!', 'success')
         return redirect(url_for('editor.dashboard'))
     return render_template('create_potw.html', form=form, title='New Personality')
@@ -288,6 +307,7 @@ def new_event():
         )
         db.session.add(event)
         db.session.commit()
+        cache.invalidate('events')
         flash('New event has been created!', 'success')
         return redirect(url_for('editor.dashboard'))
     return render_template('create_event.html', form=form, title='New Event')
@@ -295,15 +315,165 @@ def new_event():
 # api route for bus tracking
 @main.route('/api/buses')
 def get_buses():
-    buses = BusLocation.query.all()
-    return jsonify([{
-        'id': bus.bus_id,
-        'route': bus.route,
-        'position': [bus.longitude, bus.latitude],
-        'lastUpdate': bus.last_update.strftime('%H:%M:%S'),
-        'status': bus.status,
-        'driver': User.query.get(bus.driver_id).username if bus.driver_id else None
-    } for bus in buses])
+    """
+    Live bus positions. Optional filters: `bbox=min_lng,min_lat,max_lng,max_lat`,
+    `route` (substring), `status` (comma separated); `compact=1` returns rows
+    as arrays with short field names.
+    """
+    bbox = request.args.get('bbox')
+    if bbox:
+        try:
+            bbox = tuple(float(v) for v in bbox.split(','))
+        except ValueError:
+            bbox = ()
+        # float() accepts 'nan' and 'inf', which no viewport can contain
+        if len(bbox) != 4 or not all(math.isfinite(v) for v in bbox) or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            return jsonify({'success': False, 'error': 'Invalid bbox'}), 400
+    else:
+        bbox = None
+    statuses = {v for v in request.args.get('status', '').split(',') if v}
+    compact = request.args.get('compact', '').lower() in ('1', 'true')
+    
+    snapshot = get_bus_snapshot()
+    body, etag = snapshot.variant(bbox, request.args.get('route'), statuses, compact)
+    
+    # Unchanged polls get a 304 without touching the database or re-encoding
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+    
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+@main.route('/api/buses/stream')
+def bus_stream():
+    """Server-Sent Events stream of bus position changes for the live map"""
+    config = current_app.config
+    last_seq = request.headers.get('Last-Event-ID', type=int)
+    
+    # A reconnect that missed too much (or is new) starts from a full snapshot
+    send_snapshot = last_seq is None or bus_channel.since(last_seq) is None
+    subscription = bus_channel.subscribe(last_seq=None if send_snapshot else last_seq)
+    
+    def generate():
+        try:
+            yield 'retry: 2000\n\n'
+            etag = None
+            started = last_sent = last_resync = time.monotonic()
+            
+            if send_snapshot:
+                snapshot = get_bus_snapshot()
+                db.session.remove()
+                etag = snapshot.etag
+                yield f"event: snapshot\ndata: {snapshot.body.decode('utf-8')}\n\n"
+            
+            while time.monotonic() - started < config['BUS_STREAM_MAX_AGE']:
+                message = subscription.get(timeout=config['BUS_STREAM_RESYNC'])
+                now = time.monotonic()
+                if message is not None:
+                    last_sent = now
+                    yield format_sse(message)
+                
+                # Pick up changes that were written through another worker process
+                if now - last_resync >= config['BUS_STREAM_RESYNC']:
+                    last_resync = now
+                    snapshot = get_bus_snapshot()
+                    db.session.remove()
+                    if snapshot.etag != etag:
+                        etag = snapshot.etag
+                        last_sent = now
+                        yield f"event: snapshot\ndata: {snapshot.body.decode('utf-8')}\n\n"
+                
+                if now - last_sent >= config['BUS_STREAM_HEARTBEAT']:
+                    last_sent = now
+                    yield ': heartbeat\n\n'
+        finally:
+            subscription.close()
+    
+    response = current_app.response_class(stream_with_context(generate()), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
+@main.route('/api/buses/poll')
+def poll_buses():
+    """Long-poll fallback for the bus stream; pass the last seen `seq` as `since`"""
+    since = request.args.get('since', type=int)
+    
+    if since is not None:
+        bus_channel.wait(since, current_app.config['BUS_LONG_POLL_TIMEOUT'])
+        messages = bus_channel.since(since)
+        if messages:
+            updates = ','.join(payload for _, _, payload in messages)
+            return current_app.response_class(f'{{"seq":{messages[-1][0]},"updates":[{updates}]}}',
+                                              mimetype='application/json')
+    
+    # First request, too far behind to replay, or nothing published here
+    # before the timeout (changes may have gone through another worker)
+    seq = bus_channel.seq
+    snapshot = get_bus_snapshot()
+    return current_app.response_class(f'{{"seq":{seq},"buses":{snapshot.body.decode("utf-8")}}}',
+                                      mimetype='application/json')
+
+def _chunked(parts, size=500):
+    # Group many small strings into larger chunks for streaming responses
+    buffer = []
+    for part in parts:
+        buffer.append(part)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+@main.route('/api/buses/<bus_id>/track')
+def bus_track(bus_id):
+    """
+    Replay a bus's recorded track between `start` and `end` (epoch seconds,
+    default: the last hour). `format=polyline` returns a Google encoded
+    polyline instead of a JSON array of [ts, lat, lng] points.
+    """
+    bus = BusLocation.query.filter_by(bus_id=bus_id).first_or_404()
+    
+    end = request.args.get('end', int(time.time()), type=int)
+    start = request.args.get('start', end - 3600, type=int)
+    if start > end or end - start > current_app.config['TRACK_MAX_WINDOW']:
+        return jsonify({'success': False, 'error': 'Invalid time window'}), 400
+    
+    points = iter_track(bus.id, start, end)
+    
+    if request.args.get('format') == 'polyline':
+        body = encode_polyline((lat, lng) for _, lat, lng in points)
+        mimetype = 'text/plain'
+    else:
+        def generate():
+            yield '['
+            separator = ''
+            for ts, lat, lng in points:
+                yield f'{separator}[{ts},{lat / 1e5},{lng / 1e5}]'
+                separator = ','
+            yield ']'
+        body = generate()
+        mimetype = 'application/json'
+    
+    return current_app.response_class(stream_with_context(_chunked(body)), mimetype=mimetype)
+
+@main.route('/api/stops/<int:stop_id>/arrivals')
+def stop_arrivals(stop_id):
+    """Predicted arrivals of live buses at a stop, soonest first"""
+    limit = min(request.args.get('limit', 3, type=int), 10)
+    snapshot = get_bus_snapshot()
+    arrivals = eta_engine.arrivals(stop_id, snapshot, limit=limit)
+    if arrivals is None:
+        abort(404)
+    
+    response = jsonify({'stop': stop_id, 'arrivals': arrivals})
+    # Predictions only move when buses do; let clients and proxies reuse them briefly
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['ETA_CACHE_SECONDS']
+    return response
 
 @editor.route('/bus/update', methods=['GET', 'POST'])
 @login_required
@@ -327,6 +497,9 @@ def update_bus():
             )
             db.session.add(bus)
         db.session.commit()
+        # The admin's position replaces anything still buffered from the driver
+        location_store.discard(bus.id)
+        invalidate_bus_snapshot()
         flash('Bus location updated!', 'success')
         return redirect(url_for('editor.dashboard'))
     return render_template('update_bus.html', form=form)
@@ -363,6 +536,7 @@ def assign_bus():
             db.session.add(bus)
         
         db.session.commit()
+        invalidate_bus_snapshot()
         flash(f'Bus {form.bus_id.data} has been assigned to driver successfully!', 'success')
         return redirect(url_for('editor.dashboard'))
     
@@ -397,15 +571,14 @@ def edit_post(post_id):
         
         # Update image if a new one is provided
         if form.image.data:
-            # Delete old image if it's from S3
-            if 'http' in post.image_file and post.image_file != 'default_blog.jpg':
-                from app.utils.s3_helper import delete_file_from_s3
-                delete_file_from_s3(post.image_file)
+            # Delete the old image in the background (default images are left alone)
+            delete_image(post.image_file)
             
             # Save new image
             post.image_file = save_image(form.image.data, 'blog_pics')
         
         db.session.commit()
+        cache.invalidate('posts')
         flash('Your post has been updated!', 'success')
         return redirect(url_for('editor.dashboard'))
     
@@ -450,15 +623,14 @@ def edit_potw(potw_id):
         
         # Update image if a new one is provided
         if form.image.data:
-            # Delete old image if it's from S3
-            if 'http' in personality.image_file:
-                from app.utils.s3_helper import delete_file_from_s3
-                delete_file_from_s3(personality.image_file)
+            # Delete the old image in the background (default images are left alone)
+            delete_image(personality.image_file)
             
             # Save new image
             personality.image_file = save_image(form.image.data, 'potw_pics')
         
         db.session.commit()
+        cache.invalidate('potw')
         flash('Personality has been updated!', 'success')
         return redirect(url_for('editor.dashboard'))
     
@@ -497,15 +669,14 @@ def edit_event(event_id):
         
         # Update image if a new one is provided
         if form.image.data:
-            # Delete old image if it's from S3
-            if event.image_file and 'http' in event.image_file:
-                from app.utils.s3_helper import delete_file_from_s3
-                delete_file_from_s3(event.image_file)
+            # Delete the old image in the background (default images are left alone)
+            delete_image(event.image_file)
             
             # Save new image
             event.image_file = save_image(form.image.data, 'event_pics')
         
         db.session.commit()
+        cache.invalidate('events')
         flash('Event has been updated!', 'success')
         return redirect(url_for('editor.dashboard'))
     
@@ -537,10 +708,8 @@ def delete_post(post_id):
     if post.author != current_user and current_user.role != 'admin':
         abort(403)
     
-    # Delete image from S3 if applicable
-    if post.image_file and post.image_file != 'default_blog.jpg' and 'http' in post.image_file:
-        from app.utils.s3_helper import delete_file_from_s3
-        delete_file_from_s3(post.image_file)
+    # Delete the image in the background (default images are left alone)
+    delete_image(post.image_file)
     
     # Delete all comments associated with the post
     Comment.query.filter_by(post_id=post.id).delete()
@@ -548,6 +717,7 @@ def delete_post(post_id):
     # Delete the post
     db.session.delete(post)
     db.session.commit()
+    cache.invalidate('posts')
     
     flash('Blog post has been deleted!', 'success')
     return redirect(url_for('editor.dashboard'))
@@ -561,10 +731,8 @@ def delete_potw(potw_id):
     
     personality = PersonalityOfTheWeek.query.get_or_404(potw_id)
     
-    # Delete image from S3 if applicable
-    if personality.image_file and 'http' in personality.image_file:
-        from app.utils.s3_helper import delete_file_from_s3
-        delete_file_from_s3(personality.image_file)
+    # Delete the image in the background (default images are left alone)
+    delete_image(personality.image_file)
     
     # Delete all comments associated with the personality
     PotwComment.query.filter_by(potw_id=personality.id).delete()
@@ -585,6 +753,7 @@ def delete_potw(potw_id):
             db.session.commit()
             flash(f'Active personality deleted and {newest.name} was set as active.', 'info')
     
+    cache.invalidate('potw')
     flash('Personality has been deleted!', 'success')
     return redirect(url_for('editor.dashboard'))
 
@@ -597,14 +766,13 @@ def delete_event(event_id):
     
     event = Event.query.get_or_404(event_id)
     
-    # Delete image from S3 if applicable
-    if event.image_file and 'http' in event.image_file:
-        from app.utils.s3_helper import delete_file_from_s3
-        delete_file_from_s3(event.image_file)
+    # Delete the image in the background (default images are left alone)
+    delete_image(event.image_file)
     
     # Delete the event
     db.session.delete(event)
     db.session.commit()
+    cache.invalidate('events')
     
     flash('Event has been deleted!', 'success')
     return redirect(url_for('editor.dashboard'))
@@ -649,6 +817,7 @@ def add_banner():
         
         db.session.add(banner)
         db.session.commit()
+        cache.invalidate('banners')
         
         flash('Banner added successfully!', 'success')
     else:
@@ -674,15 +843,14 @@ def edit_banner(banner_id):
         
         # Update image if a new one is provided
         if form.image.data:
-            # Delete old image if it's from S3
-            if banner.image_file and 'http' in banner.image_file:
-                from app.utils.s3_helper import delete_file_from_s3
-                delete_file_from_s3(banner.image_file)
+            # Delete the old image in the background (default images are left alone)
+            delete_image(banner.image_file)
             
             # Save new image
             banner.image_file = save_image(form.image.data, 'banners')
         
         db.session.commit()
+        cache.invalidate('banners')
         flash('Banner updated successfully!', 'success')
         return redirect(url_for('editor.manage_banners'))
     
@@ -702,10 +870,8 @@ def delete_banner(banner_id):
     
     banner = HomeBanner.query.get_or_404(banner_id)
     
-    # Delete image from S3 if applicable
-    if banner.image_file and 'http' in banner.image_file:
-        from app.utils.s3_helper import delete_file_from_s3
-        delete_file_from_s3(banner.image_file)
+    # Delete the image in the background (default images are left alone)
+    delete_image(banner.image_file)
     
     db.session.delete(banner)
     
@@ -715,6 +881,7 @@ def delete_banner(banner_id):
         b.order = i
     
     db.session.commit()
+    cache.invalidate('banners')
     
     flash('Banner deleted successfully!', 'success')
     return redirect(url_for('editor.manage_banners'))
@@ -737,6 +904,7 @@ def update_banner_order():
             banner.order = new_order
     
     db.session.commit()
+    cache.invalidate('banners')
     
     return jsonify({'success': True})
 
@@ -754,6 +922,7 @@ def toggle_banner():
     if banner:
         banner.is_active = is_active
         db.session.commit()
+        cache.invalidate('banners')
         return jsonify({'success': True})
     
     return jsonify({'success': False, 'error': 'Banner not found'}), 404
@@ -764,11 +933,81 @@ def toggle_banner():
 gallery = Blueprint('gallery', __name__, url_prefix='/gallery')
 
 # Public gallery route
+# Public gallery order; backed by the ix_gallery_photo_*_order indexes
+GALLERY_ORDER = [(GalleryPhoto.order, False), (GalleryPhoto.date_posted, True), (GalleryPhoto.id, True)]
+
+def gallery_categories():
+    """
+    Categories with their active photo counts, [(id, slug, name, count)],
+    and the total; cached until a photo or category changes
+    """
+    def load():
+        counts = dict(db.session.query(GalleryPhoto.category_id, db.func.count(GalleryPhoto.id))
+                      .filter(GalleryPhoto.is_active.is_(True))
+                      .group_by(GalleryPhoto.category_id))
+        categories = [(c.id, c.slug, c.name, counts.get(c.id, 0))
+                      for c in GalleryCategory.query.order_by(GalleryCategory.id)]
+        return categories, sum(count for _, _, _, count in categories)
+    return cache.get_or_set('gallery:categories', ['gallery'], current_app.config['COUNT_CACHE_TTL'], load)
+
+def gallery_page(categories, slug=None, cursor=None):
+    """One page of active photos, optionally in one category; None for an unknown category"""
+    query = GalleryPhoto.query.filter(GalleryPhoto.is_active.is_(True))
+    total = sum(count for _, _, _, count in categories)
+    if slug:
+        category = next((c for c in categories if c[1] == slug), None)
+        if category is None:
+            return None
+        query = query.filter(GalleryPhoto.category_id == category[0])
+        total = category[3]
+    return keyset_paginate(query, GALLERY_ORDER, per_page=current_app.config['GALLERY_PAGE_SIZE'],
+                           after=cursor, total=total)
+
 @gallery.route('/')
 def index():
-    photos = GalleryPhoto.query.filter_by(is_active=True).order_by(GalleryPhoto.order, GalleryPhoto.date_posted.desc()).all()
-    categories = GalleryCategory.query.all()
-    return render_template('gallery.html', photos=photos, categories=categories)
+    categories, total = gallery_categories()
+    category = request.args.get('category') or None
+    page = gallery_page(categories, category)
+    if page is None:
+        abort(404)
+    
+    # A shared link to a photo beyond the first page still opens it
+    photo_id = request.args.get('photo', type=int)
+    if photo_id and all(photo.id != photo_id for photo in page.items):
+        photo = GalleryPhoto.query.filter_by(id=photo_id, is_active=True).first()
+        if photo:
+            page.items.insert(0, photo)
+    
+    return render_template('gallery.html', page=page, categories=categories, total=total,
+                           category=category, category_slugs={c[0]: c[1] for c in categories})
+
+@gallery.route('/api/photos')
+def api_photos():
+    categories, _ = gallery_categories()
+    try:
+        page = gallery_page(categories, request.args.get('category') or None, request.args.get('cursor'))
+    except InvalidCursor:
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    if page is None:
+        return jsonify({'success': False, 'error': 'Unknown category'}), 404
+    
+    category_slugs = {c[0]: c[1] for c in categories}
+    render_pins = get_template_attribute('macros/gallery_helper.html', 'render_pins')
+    return jsonify({
+        'success': True,
+        'photos': [{
+            'id': photo.id,
+            'title': photo.title,
+            'description': photo.description,
+            'category': category_slugs.get(photo.category_id),
+            'image': image_url(photo.image_file, 'uploads/gallery'),
+            'date_posted': photo.date_posted.isoformat(),
+            'likes': photo.likes or 0,
+        } for photo in page.items],
+        'html': str(render_pins(page.items, category_slugs)),
+        'next_cursor': page.next_cursor,
+        'total': page.total,
+    })
 
 # Editor routes for gallery management
 @editor.route('/gallery/manage')
@@ -808,6 +1047,7 @@ def add_gallery_category():
             category = GalleryCategory(name=form.name.data, slug=slug)
             db.session.add(category)
             db.session.commit()
+            cache.invalidate('gallery')
             flash('New gallery category added!', 'success')
     
     return redirect(url_for('editor.manage_gallery'))
@@ -839,6 +1079,7 @@ def upload_photo():
             )
             db.session.add(photo)
             db.session.commit()
+            cache.invalidate('gallery')
             flash('Photo uploaded successfully!', 'success')
         else:
             flash('Please upload an image.', 'danger')
@@ -868,15 +1109,14 @@ def edit_photo(photo_id):
         photo.is_active = form.is_active.data
         
         if form.image.data:
-            # Delete old image if applicable
-            if photo.image_file and 'http' in photo.image_file:
-                from app.utils.s3_helper import delete_file_from_s3
-                delete_file_from_s3(photo.image_file)
+            # Delete the old image in the background (default images are left alone)
+            delete_image(photo.image_file)
             
             # Save new image
             photo.image_file = save_image(form.image.data, 'uploads/gallery')
         
         db.session.commit()
+        cache.invalidate('gallery')
         flash('Photo updated successfully!', 'success')
         return redirect(url_for('editor.manage_gallery'))
     
@@ -897,10 +1137,8 @@ def delete_photo(photo_id):
     
     photo = GalleryPhoto.query.get_or_404(photo_id)
     
-    # Delete image from S3 if applicable
-    if photo.image_file and 'http' in photo.image_file:
-        from app.utils.s3_helper import delete_file_from_s3
-        delete_file_from_s3(photo.image_file)
+    # Delete the image in the background (default images are left alone)
+    delete_image(photo.image_file)
     
     db.session.delete(photo)
     
@@ -910,6 +1148,7 @@ def delete_photo(photo_id):
         p.order = i
     
     db.session.commit()
+    cache.invalidate('gallery')
     flash('Photo deleted successfully!', 'success')
     return redirect(url_for('editor.manage_gallery'))
 
@@ -922,6 +1161,7 @@ def toggle_photo(photo_id):
     photo = GalleryPhoto.query.get_or_404(photo_id)
     photo.is_active = not photo.is_active
     db.session.commit()
+    cache.invalidate('gallery')
     
     return jsonify({
         'success': True, 
@@ -943,41 +1183,134 @@ def update_photo_order():
         new_order = photo_data.get('order')
         
         photo = GalleryPhoto.query.get(photo_id)
-        if photo:
+        if photo and isinstance(new_order, int):
             photo.order = new_order
     
     db.session.commit()
     
     return jsonify({'success': True})
 
-# API route for likes
+# API routes for likes
+# Largest id a db.Integer primary key can hold; bigger ids overflow the driver
+MAX_PHOTO_ID = 2 ** 31 - 1
+
 @gallery.route('/api/like/<int:photo_id>', methods=['POST'])
 def like_photo(photo_id):
-    photo = GalleryPhoto.query.get_or_404(photo_id)
-    photo.likes += 1
-    db.session.commit()
-    return jsonify({'success': True, 'likes': photo.likes})
+    if photo_id > MAX_PHOTO_ID:
+        abort(404)
+    likes = like_counts([photo_id])
+    if photo_id not in likes:
+        abort(404)
+    # Buffered and flushed in batches; repeat likes from one address are dropped
+    if record_likes([photo_id], request.remote_addr):
+        likes[photo_id] += 1
+    return jsonify({'success': True, 'likes': likes[photo_id]})
+
+@gallery.route('/api/likes', methods=['POST'])
+def like_photos():
+    """Like several photos at once: {"photo_ids": [1, 2, 3]} -> {"likes": {"1": 10, ...}}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    photo_ids = data.get('photo_ids')
+    if not isinstance(photo_ids, list) or len(photo_ids) > current_app.config['LIKE_BATCH_MAX']:
+        return jsonify({'success': False, 'error': 'Invalid photo_ids'}), 400
+    try:
+        photo_ids = [int(photo_id) for photo_id in photo_ids]
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'success': False, 'error': 'Invalid photo_ids'}), 400
+    if not all(0 < photo_id <= MAX_PHOTO_ID for photo_id in photo_ids):
+        return jsonify({'success': False, 'error': 'Invalid photo_ids'}), 400
+    
+    likes = like_counts(photo_ids)
+    for photo_id in record_likes([photo_id for photo_id in photo_ids if photo_id in likes], request.remote_addr):
+        likes[photo_id] += 1
+    return jsonify({'success': True, 'likes': likes})
 
 
 # Create a new blueprint for Face of HESA
 foh = Blueprint('foh', __name__, url_prefix='/face-of-hesa')
 
-# Global voting settings
+# Voting settings, stored in the database so every worker process agrees
 class VotingSettings:
-    is_voting_active = True
-    vote_cost = 1.0  # Cost per vote in GHS
+    @staticmethod
+    def is_voting_active():
+        return get_setting('foh.voting_active')
+    
+    @staticmethod
+    def vote_cost():
+        return get_setting('foh.vote_cost')  # Cost per vote in GHS
 
 # Public routes for Face of HESA
 @foh.route('/')
 def index():
-    contestants = FohContestant.query.filter_by(is_active=True).order_by(FohContestant.votes.desc()).all()
-    voting_active = VotingSettings.is_voting_active
-    vote_cost = VotingSettings.vote_cost
+    # Started here too, so votes left unverified by a restart are re-queued
+    # without waiting for the next payment
+    verification_queue.start(current_app._get_current_object())
+    # Served from the in-memory leaderboard, not a query per page view
+    contestants = leaderboard.ranking()
+    voting_active = VotingSettings.is_voting_active()
+    vote_cost = VotingSettings.vote_cost()
     return render_template('foh.html', contestants=contestants, voting_active=voting_active, vote_cost=vote_cost)
 
+@foh.route('/api/leaderboard')
+def leaderboard_api():
+    """Contestants ranked by votes, as JSON"""
+    body, etag = leaderboard.encoded()
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype='application/json')
+    
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+@foh.route('/api/leaderboard/stream')
+def leaderboard_stream():
+    """Server-Sent Events stream of vote totals: a full `leaderboard` event, then `votes` updates"""
+    config = current_app.config
+    subscription = leaderboard_channel.subscribe()
+    
+    def generate():
+        try:
+            yield 'retry: 2000\n\n'
+            body, etag = leaderboard.encoded()
+            db.session.remove()
+            yield f"event: leaderboard\ndata: {body.decode('utf-8')}\n\n"
+            started = last_sent = last_resync = time.monotonic()
+            
+            while time.monotonic() - started < config['BUS_STREAM_MAX_AGE']:
+                message = subscription.get(timeout=config['LEADERBOARD_REFRESH'])
+                now = time.monotonic()
+                if message is not None:
+                    last_sent = now
+                    yield format_sse(message)
+                
+                # Votes verified by other worker processes show up on reload
+                if now - last_resync >= config['LEADERBOARD_REFRESH']:
+                    last_resync = now
+                    body, new_etag = leaderboard.encoded()
+                    db.session.remove()
+                    if new_etag != etag:
+                        etag = new_etag
+                        last_sent = now
+                        yield f"event: leaderboard\ndata: {body.decode('utf-8')}\n\n"
+                
+                if now - last_sent >= config['BUS_STREAM_HEARTBEAT']:
+                    last_sent = now
+                    yield ': heartbeat\n\n'
+        finally:
+            subscription.close()
+    
+    response = current_app.response_class(stream_with_context(generate()), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @foh.route('/vote/<int:contestant_id>', methods=['POST'])
 def process_vote(contestant_id):
-    if not VotingSettings.is_voting_active:
+    if not VotingSettings.is_voting_active():
         flash('Voting is currently closed.', 'warning')
         return redirect(url_for('foh.index'))
     
@@ -988,7 +1321,7 @@ def process_vote(contestant_id):
     email = request.form.get('email', '')
     
     # Calculate amount
-    amount = votes * VotingSettings.vote_cost
+    amount = votes * VotingSettings.vote_cost()
     
     # Generate a unique reference
     reference = f"foh-{contestant_id}-{secrets.token_hex(6)}"
@@ -1026,23 +1359,44 @@ def initiate_payment(reference):
 
 @foh.route('/verify/<reference>')
 def verify_payment(reference):
-    # In a real implementation, this would verify the payment with Paystack API
-    # For demo purposes, we'll just mark the vote as verified
-    
     vote = FohVote.query.filter_by(transaction_ref=reference).first_or_404()
+    contestant = FohContestant.query.get_or_404(vote.contestant_id)
     
-    # Mark vote as verified
-    vote.verified = True
-    
-    # Update contestant vote count
-    contestant = FohContestant.query.get(vote.contestant_id)
-    contestant.votes += vote.votes_count
+    if vote.verified:
+        flash(f'Thank you! Your {vote.votes_count} vote(s) for {contestant.name} has been recorded.', 'success')
+        return redirect(url_for('foh.index'))
     
-    db.session.commit()
+    # Confirm the payment with Paystack in the background rather than
+    # holding this request open on the gateway
+    verification_queue.start(current_app._get_current_object())
+    verification_queue.submit(reference)
     
-    flash(f'Thank you! Your {vote.votes_count} vote(s) for {contestant.name} has been recorded.', 'success')
+    flash(f'Thank you! Your {vote.votes_count} vote(s) for {contestant.name} will be counted as soon as '
+          f'Paystack confirms the payment.', 'success')
     return redirect(url_for('foh.index'))
 
+@foh.route('/webhook/paystack', methods=['POST'])
+@csrf.exempt
+def paystack_webhook():
+    """Paystack event notifications; successful charges are queued to be recorded in bulk"""
+    body = request.get_data()
+    if not valid_signature(body, request.headers.get('X-Paystack-Signature')):
+        abort(401)
+    
+    try:
+        event = json.loads(body)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid JSON'}), 400
+    
+    data = event.get('data') or {}
+    reference = data.get('reference')
+    if event.get('event') == 'charge.success' and reference and isinstance(data.get('amount'), int):
+        verification_queue.start(current_app._get_current_object())
+        verification_queue.submit(reference, paid_amount=data['amount'])
+    
+    # Acknowledge quickly; Paystack retries anything that isn't a 200
+    return jsonify({'success': True})
+
 # Admin routes for Face of HESA management
 @editor.route('/foh/manage')
 @login_required
@@ -1056,8 +1410,8 @@ def manage_foh():
     return render_template('manage_foh.html', 
                           contestants=contestants, 
                           form=form, 
-                          voting_active=VotingSettings.is_voting_active,
-                          vote_cost=VotingSettings.vote_cost)
+                          voting_active=VotingSettings.is_voting_active(),
+                          vote_cost=VotingSettings.vote_cost())
 
 @editor.route('/foh/add', methods=['POST'])
 @login_required
@@ -1081,6 +1435,7 @@ def add_contestant():
         
         db.session.add(contestant)
         db.session.commit()
+        leaderboard.invalidate()
         
         flash('Contestant added successfully!', 'success')
     else:
@@ -1105,15 +1460,14 @@ def edit_contestant(contestant_id):
         contestant.is_active = form.is_active.data
         
         if form.image.data:
-            # Delete old image if applicable
-            if contestant.image_file != 'default_contestant.jpg' and 'http' in contestant.image_file:
-                from app.utils.s3_helper import delete_file_from_s3
-                delete_file_from_s3(contestant.image_file)
+            # Delete the old image in the background (default images are left alone)
+            delete_image(contestant.image_file)
             
             # Save new image
             contestant.image_file = save_image(form.image.data, 'foh_pics')
         
         db.session.commit()
+        leaderboard.invalidate()
         flash('Contestant updated successfully!', 'success')
         return redirect(url_for('editor.manage_foh'))
     
@@ -1133,10 +1487,8 @@ def delete_contestant(contestant_id):
     
     contestant = FohContestant.query.get_or_404(contestant_id)
     
-    # Delete image if applicable
-    if contestant.image_file != 'default_contestant.jpg' and 'http' in contestant.image_file:
-        from app.utils.s3_helper import delete_file_from_s3
-        delete_file_from_s3(contestant.image_file)
+    # Delete the image in the background (default images are left alone)
+    delete_image(contestant.image_file)
     
     # Delete associated votes
     FohVote.query.filter_by(contestant_id=contestant.id).delete()
@@ -1144,6 +1496,7 @@ def delete_contestant(contestant_id):
     # Delete the contestant
     db.session.delete(contestant)
     db.session.commit()
+    leaderboard.invalidate()
     
     flash('Contestant deleted successfully!', 'success')
     return redirect(url_for('editor.manage_foh'))
@@ -1155,9 +1508,10 @@ def toggle_voting():
         abort(403)
     
     # Toggle voting status
-    VotingSettings.is_voting_active = not VotingSettings.is_voting_active
+    voting_active = not VotingSettings.is_voting_active()
+    set_setting('foh.voting_active', voting_active)
     
-    status = "enabled" if VotingSettings.is_voting_active else "disabled"
+    status = "enabled" if voting_active else "disabled"
     flash(f'Voting has been {status}!', 'success')
     
     return redirect(url_for('editor.manage_foh'))
@@ -1173,7 +1527,7 @@ def update_vote_cost():
         if new_cost <= 0:
             raise ValueError("Cost must be positive")
         
-        VotingSettings.vote_cost = new_cost
+        set_setting('foh.vote_cost', new_cost)
         flash(f'Vote cost updated to GHS {new_cost:.2f}!', 'success')
     except ValueError:
         flash('Invalid vote cost. Please enter a positive number.', 'danger')
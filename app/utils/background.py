@@ -0,0 +1,61 @@
+import atexit
+import threading
+import traceback
+
+
+class PeriodicTask:
+    """
+    Run a function every `interval` seconds on a daemon thread inside an
+    application context. Used for write-behind flushers: the thread is
+    started lazily on first use (so each gunicorn worker gets its own after
+    forking) and, unless run_on_exit is False, the function runs one last
+    time when the process exits. With run_on_start it also runs as soon as
+    the thread starts, rather than only after the first interval.
+    """
+
+    def __init__(self, name, func, run_on_exit=True, run_on_start=False):
+        self.name = name
+        self.func = func
+        self.run_on_exit = run_on_exit
+        self.run_on_start = run_on_start
+        self.app = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def start(self, app, interval):
+        """Start the background thread if it isn't already running"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.app = app
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._loop, args=(interval,), name=self.name, daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+
+    def _loop(self, interval):
+        if self.run_on_start:
+            self.run_once()
+        while not self.stopped.wait(interval):
+            self.run_once()
+
+    def run_once(self):
+        """Run the task now, in the app context; errors are logged, not raised"""
+        if self.app is None:
+            return
+        with self.app.app_context():
+            try:
+                self.func()
+            except Exception:
+                print(f"{self.name} error: {traceback.format_exc()}")
+
+    def stop(self):
+        """Stop the thread and run the task one final time"""
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.run_on_exit:
+            self.run_once()
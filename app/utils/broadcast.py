@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class Subscription:
+    """
+    A single client's view of a Broadcaster.
+    Messages are held in a bounded queue: if the client falls behind, the
+    oldest undelivered messages are dropped rather than buffering without
+    limit, so one slow connection can't grow server memory.
+    """
+
+    def __init__(self, broadcaster, max_queue):
+        self.broadcaster = broadcaster
+        self.messages = deque(maxlen=max_queue)
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def offer(self, message):
+        with self.condition:
+            if len(self.messages) == self.messages.maxlen:
+                self.dropped += 1
+            self.messages.append(message)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Wait for the next message; returns None if the timeout expires"""
+        with self.condition:
+            if not self.messages:
+                self.condition.wait(timeout)
+            if self.messages:
+                return self.messages.popleft()
+            return None
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class Broadcaster:
+    """
+    In-process publish/subscribe channel used for push endpoints.
+    Each published event is encoded once and the same message is handed to
+    every subscriber. A short history is kept so long-poll clients and
+    reconnecting EventSource clients can catch up from a sequence number.
+    """
+
+    def __init__(self, max_queue=64, history=256):
+        self.max_queue = max_queue
+        self.seq = 0
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def publish(self, event, data):
+        """
+        Send an event to every subscriber
+        :param event: Event name (used as the SSE event field)
+        :param data: JSON-serializable payload
+        :return: Sequence number assigned to the event
+        """
+        payload = json.dumps(data, separators=(',', ':'))
+        with self.lock:
+            self.seq += 1
+            message = (self.seq, event, payload)
+            self.history.append(message)
+            subscribers = list(self.subscribers)
+            self.changed.notify_all()
+
+        for subscription in subscribers:
+            subscription.offer(message)
+        return message[0]
+
+    def subscribe(self, last_seq=None):
+        """
+        Register a new subscriber
+        :param last_seq: Replay buffered events newer than this sequence number
+        :return: Subscription
+        """
+        subscription = Subscription(self, self.max_queue)
+        with self.lock:
+            if last_seq is not None:
+                for message in self.history:
+                    if message[0] > last_seq:
+                        subscription.offer(message)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def since(self, last_seq):
+        """
+        Return buffered events newer than last_seq, or None if some of them
+        have already fallen out of the history and the caller must resync
+        """
+        with self.lock:
+            if last_seq > self.seq:
+                # Sequence from another process or before a restart
+                return None
+            if self.history and last_seq < self.history[0][0] - 1:
+                return None
+            return [message for message in self.history if message[0] > last_seq]
+
+    def wait(self, last_seq, timeout):
+        """Block until an event newer than last_seq is published or timeout expires"""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while self.seq <= last_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+            return self.seq
+
+
+def format_sse(message):
+    """Encode a (seq, event, payload) message as a Server-Sent Events frame"""
+    seq, event, payload = message
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
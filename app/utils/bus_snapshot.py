@@ -0,0 +1,179 @@
+import hashlib
+import threading
+import time
+from flask import current_app
+from app import db
+from app.models import BusLocation, User
+from app.utils.broadcast import Broadcaster
+from app.utils.location_store import current_position
+
+# Shared, serialized copy of the /api/buses payload. Every map client polls
+# the endpoint, so the bus list is queried and encoded once and then reused
+# until a driver (or an admin) writes a new position.
+_lock = threading.Lock()
+_snapshot = None
+_dirty = True
+
+# Push channel for the live map; every position change is published once
+# and fanned out to all connected viewers in this process
+bus_channel = Broadcaster()
+
+
+# Size of a spatial index cell in degrees (~550 m on campus)
+GRID_CELL = 0.005
+
+# Field order of the compact (array) response format
+COMPACT_FIELDS = ['id', 'r', 'lng', 'lat', 't', 's', 'd']
+
+
+def _cell(lng, lat):
+    return int(lng // GRID_CELL), int(lat // GRID_CELL)
+
+
+class BusSnapshot:
+    """
+    A serialized bus list plus the ETag derived from its contents.
+    Buses are also bucketed into a lat/lng grid so viewport (bbox) queries
+    only look at the cells they overlap, and filtered or compact variants
+    are encoded once per snapshot and reused.
+    """
+
+    def __init__(self, buses, body):
+        self.buses = buses
+        self.body = body
+        # Hash the body so every worker process agrees on the ETag
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.built_at = time.monotonic()
+
+        self.grid = {}
+        for i, bus in enumerate(buses):
+            self.grid.setdefault(_cell(*bus['position']), []).append(i)
+        self._variants = {}
+
+    def select(self, bbox=None, route=None, statuses=None):
+        """
+        Filter the buses
+        :param bbox: (min_lng, min_lat, max_lng, max_lat) viewport
+        :param route: Case-insensitive substring of the route name
+        :param statuses: Set of statuses to keep
+        """
+        if bbox is None:
+            candidates = self.buses
+        else:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            (x1, y1), (x2, y2) = _cell(min_lng, min_lat), _cell(max_lng, max_lat)
+            if (x2 - x1 + 1) * (y2 - y1 + 1) > len(self.grid):
+                # Viewport covers more cells than are occupied; walk the buses instead
+                indexes = range(len(self.buses))
+            else:
+                indexes = sorted(i for x in range(x1, x2 + 1) for y in range(y1, y2 + 1)
+                                 for i in self.grid.get((x, y), ()))
+            candidates = [
+                self.buses[i] for i in indexes
+                if min_lng <= self.buses[i]['position'][0] <= max_lng
+                and min_lat <= self.buses[i]['position'][1] <= max_lat
+            ]
+
+        if route:
+            route = route.lower()
+            candidates = [bus for bus in candidates if route in bus['route'].lower()]
+        if statuses:
+            candidates = [bus for bus in candidates if bus['status'] in statuses]
+        return candidates
+
+    def variant(self, bbox=None, route=None, statuses=None, compact=False, max_variants=64):
+        """
+        Encoded body and ETag for a filtered and/or compact view of the snapshot
+        :return: (body bytes, etag)
+        """
+        if bbox is None and not route and not statuses and not compact:
+            return self.body, self.etag
+
+        key = (bbox, route, frozenset(statuses or ()), compact)
+        cached = self._variants.get(key)
+        if cached is not None:
+            return cached
+
+        buses = self.select(bbox, route, statuses)
+        if compact:
+            data = {'f': COMPACT_FIELDS, 'b': [
+                [bus['id'], bus['route'], round(bus['position'][0], 6), round(bus['position'][1], 6),
+                 bus['lastUpdate'], bus['status'], bus['driver']]
+                for bus in buses
+            ]}
+        else:
+            data = buses
+        body = current_app.json.dumps(data, separators=(',', ':')).encode('utf-8')
+        cached = (body, hashlib.sha1(body).hexdigest())
+
+        # Bounded so arbitrary viewports can't grow memory
+        if len(self._variants) < max_variants:
+            self._variants[key] = cached
+        return cached
+
+
+def serialize_bus(bus, driver_name):
+    """Convert a BusLocation row into the dict served by the map API"""
+    # Positions not yet flushed from the hot store take precedence
+    latitude, longitude, last_update = current_position(bus)
+    return {
+        'id': bus.bus_id,
+        'route': bus.route,
+        'position': [longitude, latitude],
+        'lastUpdate': last_update.strftime('%H:%M:%S'),
+        'status': bus.status,
+        'driver': driver_name
+    }
+
+
+def _build_snapshot():
+    # One joined query instead of a User lookup per bus
+    rows = db.session.query(BusLocation, User.username) \
+        .outerjoin(User, BusLocation.driver_id == User.id) \
+        .order_by(BusLocation.id) \
+        .all()
+
+    buses = [serialize_bus(bus, username) for bus, username in rows]
+    body = current_app.json.dumps(buses, separators=(',', ':')).encode('utf-8')
+    return BusSnapshot(buses, body)
+
+
+def get_bus_snapshot():
+    """
+    Return the current bus snapshot, rebuilding it if it has been invalidated
+    :return: BusSnapshot shared by all requests in this process
+    """
+    global _snapshot, _dirty
+
+    # Writes made by other worker processes can't invalidate our copy, so
+    # also rebuild once the snapshot is older than BUS_SNAPSHOT_TTL seconds
+    ttl = current_app.config.get('BUS_SNAPSHOT_TTL', 2)
+    snapshot = _snapshot
+    if snapshot is not None and not _dirty and time.monotonic() - snapshot.built_at < ttl:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or _dirty or time.monotonic() - snapshot.built_at >= ttl:
+            # Clear the flag before querying so a write that lands while we
+            # build is picked up by the next request
+            _dirty = False
+            snapshot = _build_snapshot()
+            _snapshot = snapshot
+        return snapshot
+
+
+def invalidate_bus_snapshot():
+    """Mark the snapshot stale; call after any BusLocation write is committed"""
+    global _dirty
+    _dirty = True
+
+
+def publish_bus_update(bus, driver_name):
+    """
+    Invalidate the snapshot and push a single bus change to live map viewers
+    :param bus: BusLocation that was just committed
+    :param driver_name: Username of the bus driver (or None)
+    """
+    invalidate_bus_snapshot()
+    return bus_channel.publish('bus', serialize_bus(bus, driver_name))
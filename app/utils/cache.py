@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import CacheTag
+
+
+class TaggedCache:
+    """
+    In-process cache whose entries are labelled with tags ('posts',
+    'banners', ...). Writers invalidate tags rather than keys, so an edit
+    only drops the entries that depend on what changed.
+
+    Tag versions are also stored in the cache_tag table: each process
+    re-reads them at most every CACHE_TAG_CHECK_INTERVAL seconds, so an
+    invalidation in one gunicorn worker reaches the others within that
+    window instead of waiting for the entry TTL.
+
+    Rendered pages ('page:' keys) live in an LRU of their own, so however
+    many page variants are requested they never evict the data entries
+    (settings, image assets, counts) every page depends on.
+    """
+
+    def __init__(self, max_entries=512, max_pages=128):
+        self.max_entries = max_entries
+        self.max_pages = max_pages
+        self._entries = OrderedDict()
+        self._pages = OrderedDict()
+        self._versions = {}
+        self._versions_checked = None
+        self._lock = threading.Lock()
+
+    def tag_versions(self):
+        """Current version of every tag (refreshed from the database periodically)"""
+        interval = current_app.config.get('CACHE_TAG_CHECK_INTERVAL', 2)
+        now = time.monotonic()
+        if self._versions_checked is None or now - self._versions_checked >= interval:
+            self._versions = dict(db.session.query(CacheTag.name, CacheTag.version).all())
+            self._versions_checked = now
+        return self._versions
+
+    def _store(self, key):
+        # (LRU, size limit) a key belongs to
+        if key.startswith('page:'):
+            return self._pages, self.max_pages
+        return self._entries, self.max_entries
+
+    def get(self, key):
+        entries, _ = self._store(key)
+        with self._lock:
+            entry = entries.get(key)
+        if entry is None:
+            return None
+
+        value, tags, expires = entry
+        versions = self.tag_versions()
+        if time.monotonic() >= expires or any(versions.get(tag, 0) != v for tag, v in tags.items()):
+            with self._lock:
+                entries.pop(key, None)
+            return None
+
+        with self._lock:
+            if key in entries:
+                entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, tags, ttl, versions=None):
+        """
+        Store a value
+        :param tags: Tags the value depends on
+        :param versions: Tag versions read before the value was computed, so
+                         an invalidation that raced with it isn't missed
+        """
+        versions = versions if versions is not None else self.tag_versions()
+        entry = (value, {tag: versions.get(tag, 0) for tag in tags}, time.monotonic() + ttl)
+        entries, max_entries = self._store(key)
+        with self._lock:
+            entries[key] = entry
+            entries.move_to_end(key)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+
+    def get_or_set(self, key, tags, ttl, compute):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            versions = self.tag_versions()
+            value = compute()
+            self.set(key, value, tags, ttl, versions=versions)
+        return value
+
+    def invalidate(self, *tags, session=None):
+        """
+        Drop every entry labelled with any of the tags, in all processes
+        :param session: Session to record the new tag versions in (and
+                        commit); defaults to db.session
+        """
+        session = session or db.session
+        with self._lock:
+            for entries in (self._entries, self._pages):
+                for key in [k for k, (_, entry_tags, _) in entries.items() if set(entry_tags) & set(tags)]:
+                    del entries[key]
+
+        try:
+            self._bump_versions(tags, session)
+        except IntegrityError:
+            # Another worker created the same tag row first; bump it instead
+            session.rollback()
+            self._bump_versions(tags, session)
+        self._versions_checked = None
+
+    @staticmethod
+    def _bump_versions(tags, session):
+        for tag in tags:
+            updated = session.query(CacheTag).filter_by(name=tag).update({'version': CacheTag.version + 1})
+            if not updated:
+                session.add(CacheTag(name=tag, version=1))
+        session.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pages.clear()
+
+
+cache = TaggedCache()
+
+
+def cached_page(*tags, ttl=None, params=()):
+    """
+    Cache the rendered response of a public GET view under the given tags.
+    Only anonymous requests with no pending flash messages are served from
+    (or stored in) the cache, since everything else renders per-user content.
+    :param params: Query string parameters the view reads; others are left
+                   out of the cache key, so junk parameters can't create
+                   a fresh entry per request
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (request.method != 'GET' or current_user.is_authenticated
+                    or session.get('_flashes') or not current_app.config.get('PAGE_CACHE_ENABLED', True)):
+                return view(*args, **kwargs)
+
+            query = urlencode(sorted((name, value) for name in params for value in request.args.getlist(name)))
+            key = f"page:{request.path}?{query}"
+            cached = cache.get(key)
+            if cached is not None:
+                body, status, mimetype = cached
+                return current_app.response_class(body, status=status, mimetype=mimetype)
+
+            versions = cache.tag_versions()
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                cache.set(key, (response.get_data(), response.status_code, response.mimetype), tags,
+                               ttl or current_app.config.get('PAGE_CACHE_TTL', 300), versions=versions)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,65 @@
+from sqlalchemy import select, update
+from app import db
+from app.models import FohContestant, FohVote
+from app.utils.leaderboard import leaderboard
+
+
+def increment(column, pk, amount=1, session=None):
+    """
+    Atomically add to an integer counter column of one row (no commit).
+    Runs as a single `UPDATE ... SET col = col + :amount`, so concurrent
+    increments never overwrite each other and the row lock is only held
+    for the statement rather than a read-modify-write round trip.
+    :param column: Model attribute, e.g. GalleryPhoto.likes
+    :param pk: Primary key of the row
+    :param session: Session to run in; defaults to db.session
+    :return: True if the row exists
+    """
+    model = column.class_
+    result = (session or db.session).execute(
+        update(model)
+        .where(model.id == pk)
+        .values({column.key: db.func.coalesce(column, 0) + amount})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def verify_votes(references):
+    """
+    Mark pending votes verified and credit their contestants, exactly once,
+    in a single transaction.
+    Each vote is flipped with a `verified IS NOT true` guard, so when the
+    same reference is verified concurrently (redirect plus webhook, a
+    retried job) only one UPDATE matches the row and only that caller adds
+    the votes. Contestants are then credited with one increment each.
+    :param references: Paystack transaction references
+    :return: List of references that were newly verified
+    """
+    newly_verified = []
+    for reference in dict.fromkeys(references):
+        result = db.session.execute(
+            update(FohVote)
+            .where(FohVote.transaction_ref == reference, FohVote.verified.isnot(True))
+            .values(verified=True)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            newly_verified.append(reference)
+
+    if not newly_verified:
+        db.session.rollback()
+        return []
+
+    totals = db.session.execute(
+        select(FohVote.contestant_id, db.func.sum(FohVote.votes_count))
+        .where(FohVote.transaction_ref.in_(newly_verified))
+        .group_by(FohVote.contestant_id)
+    ).all()
+    for contestant_id, votes in totals:
+        increment(FohContestant.votes, contestant_id, votes)
+    db.session.commit()
+
+    for contestant_id, votes in totals:
+        leaderboard.add_votes(contestant_id, votes)
+    return newly_verified
@@ -0,0 +1,300 @@
+import math
+import threading
+import time
+from bisect import bisect_right
+from flask import current_app
+from app import db
+from app.models import BusLocation, BusRoute
+from app.utils.position_history import decode_polyline, iter_track
+
+# Meters per degree of latitude; longitude is scaled by cos(latitude)
+METERS_PER_DEGREE = 111320.0
+
+
+class RouteModel:
+    """
+    Geometry and timing for one route, built from BusRoute/BusStop rows.
+    The path is projected to local meters and indexed in a uniform grid so
+    a GPS position can be snapped to "meters along the route" without
+    scanning every segment. Stop travel times are turned into a cumulative
+    time table so the time between any two points on the route is two
+    binary searches.
+    """
+
+    def __init__(self, route, cell_size=100.0, default_speed=6.0, dwell=20):
+        self.id = route.id
+        self.name = route.name
+        self.is_loop = bool(route.is_loop)
+        self.cell_size = cell_size
+
+        stops = list(route.stops)
+        points = decode_polyline(route.path) or [(s.latitude, s.longitude) for s in stops]
+        self.lat0 = sum(p[0] for p in points) / len(points)
+        self.lng0 = sum(p[1] for p in points) / len(points)
+        self.lng_scale = METERS_PER_DEGREE * math.cos(math.radians(self.lat0))
+
+        # Cumulative distance along the path at every vertex
+        self.xy = [self._project(lat, lng) for lat, lng in points]
+        self.cum = [0.0]
+        for (x1, y1), (x2, y2) in zip(self.xy, self.xy[1:]):
+            self.cum.append(self.cum[-1] + math.hypot(x2 - x1, y2 - y1))
+        self.length = self.cum[-1]
+
+        # Grid cell -> segments passing through it
+        self.grid = {}
+        for i, ((x1, y1), (x2, y2)) in enumerate(zip(self.xy, self.xy[1:])):
+            for cx in range(self._cell(min(x1, x2)), self._cell(max(x1, x2)) + 1):
+                for cy in range(self._cell(min(y1, y2)), self._cell(max(y1, y2)) + 1):
+                    self.grid.setdefault((cx, cy), []).append(i)
+
+        # Stops in route order with their distance along the path
+        self.stop_ids = [stop.id for stop in stops]
+        self.stop_names = [stop.name for stop in stops]
+        self.stop_along = [self.snap(stop.latitude, stop.longitude)[0] for stop in stops]
+
+        # Cumulative seconds from the first stop to each stop. Stops without
+        # history use the default speed plus a dwell allowance.
+        self.stop_time = [0.0]
+        for k in range(1, len(stops)):
+            self.stop_time.append(self.stop_time[-1] + self._segment_seconds(
+                stops[k].travel_seconds, self.stop_along[k] - self.stop_along[k - 1], default_speed, dwell))
+
+        # For loops, going round once more closes the table at the path end
+        if self.is_loop and stops:
+            closing = self.length - self.stop_along[-1] + self.stop_along[0]
+            self.loop_time = self.stop_time[-1] + self._segment_seconds(
+                stops[0].travel_seconds, closing, default_speed, dwell)
+        else:
+            self.loop_time = None
+        self.default_pace = 1.0 / default_speed
+
+    @staticmethod
+    def _segment_seconds(known, distance, default_speed, dwell):
+        if known is not None:
+            return float(known)
+        return max(distance, 0.0) / default_speed + dwell
+
+    def _project(self, lat, lng):
+        return ((lng - self.lng0) * self.lng_scale, (lat - self.lat0) * METERS_PER_DEGREE)
+
+    def _cell(self, value):
+        return int(math.floor(value / self.cell_size))
+
+    def snap(self, lat, lng, max_rings=3):
+        """
+        Snap a position onto the route
+        :return: (meters along the route, meters off the route)
+        """
+        x, y = self._project(lat, lng)
+        cx, cy = self._cell(x), self._cell(y)
+
+        # Search outward ring by ring; fall back to every segment if the
+        # point is far from the path
+        candidates = set()
+        for ring in range(max_rings + 1):
+            for dx in range(-ring, ring + 1):
+                for dy in range(-ring, ring + 1):
+                    if max(abs(dx), abs(dy)) == ring:
+                        candidates.update(self.grid.get((cx + dx, cy + dy), ()))
+            if candidates:
+                break
+        if not candidates:
+            candidates = range(len(self.xy) - 1)
+
+        best = (0.0, float('inf'))
+        for i in candidates:
+            (x1, y1), (x2, y2) = self.xy[i], self.xy[i + 1]
+            dx, dy = x2 - x1, y2 - y1
+            seg_len2 = dx * dx + dy * dy
+            t = 0.0 if seg_len2 == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / seg_len2))
+            offset = math.hypot(x - (x1 + t * dx), y - (y1 + t * dy))
+            if offset < best[1]:
+                best = (self.cum[i] + t * math.sqrt(seg_len2), offset)
+        return best
+
+    def segment_index(self, along):
+        """Index k of the stop a point at `along` is heading to (0 = past the last stop)"""
+        k = bisect_right(self.stop_along, along)
+        return k if k < len(self.stop_along) else 0
+
+    def time_at(self, along):
+        """Seconds from the first stop to a point `along` meters down the route"""
+        if not self.stop_along:
+            return along * self.default_pace
+        k = bisect_right(self.stop_along, along) - 1
+        if k < 0:
+            # Before the first stop (on a loop: the end of the previous lap)
+            pace = self.default_pace
+            if self.loop_time is not None:
+                span = self.length - self.stop_along[-1] + self.stop_along[0]
+                pace = (self.loop_time - self.stop_time[-1]) / span if span > 0 else 0.0
+            return (along - self.stop_along[0]) * pace
+        if k + 1 < len(self.stop_along):
+            span = self.stop_along[k + 1] - self.stop_along[k]
+            pace = (self.stop_time[k + 1] - self.stop_time[k]) / span if span > 0 else 0.0
+        elif self.loop_time is not None:
+            span = self.length - self.stop_along[k] + self.stop_along[0]
+            pace = (self.loop_time - self.stop_time[k]) / span if span > 0 else 0.0
+        else:
+            pace = self.default_pace
+        return self.stop_time[k] + (along - self.stop_along[k]) * pace
+
+
+class EtaEngine:
+    """
+    Answers "next arrivals at stop X" from the route tables and the live bus
+    snapshot. Live buses are kept per route in a list sorted by distance
+    along the route, rebuilt only when the bus snapshot changes, so each
+    query is a binary search plus the handful of buses returned.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.stop_routes = {}
+        self.loaded_at = None
+        self.live_etag = None
+        self.live = {}
+        self.results = {}
+
+    def _load(self):
+        config = current_app.config
+        routes = {}
+        for route in BusRoute.query.all():
+            if not route.path and not route.stops:
+                continue  # no path or stops to snap buses to
+            routes[route.name] = RouteModel(route,
+                                            default_speed=config.get('ETA_DEFAULT_SPEED', 6.0),
+                                            dwell=config.get('ETA_STOP_DWELL', 20))
+        self.routes = routes
+        self.stop_routes = {stop_id: model for model in routes.values() for stop_id in model.stop_ids}
+        self.loaded_at = time.monotonic()
+        self.live_etag = None
+        self.results = {}
+
+    def _index_live(self, snapshot):
+        max_offset = current_app.config.get('ETA_MAX_OFF_ROUTE', 150)
+        live = {name: [] for name in self.routes}
+        for bus in snapshot.buses:
+            model = self.routes.get(bus['route'])
+            if model is None or bus['status'] != 'active':
+                continue
+            lng, lat = bus['position']
+            along, offset = model.snap(lat, lng)
+            if offset <= max_offset:
+                live[bus['route']].append((along, bus['id']))
+        self.live = {name: (sorted(entries), [along for along, _ in sorted(entries)])
+                     for name, entries in live.items()}
+        self.live_etag = snapshot.etag
+        self.results = {}
+
+    def invalidate(self):
+        """Reload routes and stops on the next query"""
+        self.loaded_at = None
+
+    def arrivals(self, stop_id, snapshot, limit=3):
+        """
+        Next buses due at a stop
+        :param snapshot: Current BusSnapshot (live positions)
+        :return: List of {'bus', 'eta_seconds'} dicts, soonest first, or None
+                 if the stop isn't on any known route
+        """
+        with self.lock:
+            ttl = current_app.config.get('ETA_TABLE_TTL', 300)
+            if self.loaded_at is None or time.monotonic() - self.loaded_at >= ttl:
+                self._load()
+            if snapshot.etag != self.live_etag:
+                self._index_live(snapshot)
+
+            cached = self.results.get((stop_id, limit))
+            if cached is not None:
+                return cached
+
+            model = self.stop_routes.get(stop_id)
+            if model is None:
+                return None
+
+            stop_along = model.stop_along[model.stop_ids.index(stop_id)]
+            stop_time = model.time_at(stop_along)
+            buses, alongs = self.live.get(model.name, ([], []))
+            results = []
+
+            # Buses behind the stop, nearest first
+            idx = bisect_right(alongs, stop_along)
+            for j in range(idx - 1, -1, -1):
+                if len(results) >= limit:
+                    break
+                along, bus_id = buses[j]
+                results.append({'bus': bus_id, 'eta_seconds': round(stop_time - model.time_at(along))})
+
+            # On a loop, buses past the stop come round again
+            if model.is_loop and model.loop_time is not None:
+                for j in range(len(buses) - 1, idx - 1, -1):
+                    if len(results) >= limit:
+                        break
+                    along, bus_id = buses[j]
+                    eta = model.loop_time - model.time_at(along) + stop_time
+                    results.append({'bus': bus_id, 'eta_seconds': round(eta)})
+
+            self.results[(stop_id, limit)] = results
+            return results
+
+
+eta_engine = EtaEngine()
+
+
+def rebuild_segment_times(days=7, max_gap=120, max_speed=30.0, min_distance=200.0):
+    """
+    Precompute BusStop.travel_seconds from recorded position history.
+    Every pair of consecutive fixes that moves forward along the route
+    contributes its time and distance to the stop segment it falls in; the
+    segment's travel time is then its observed pace times its length.
+    :param days: How many days of history to use
+    :param max_gap: Ignore pairs of fixes further apart than this (seconds)
+    :param max_speed: Ignore implausible jumps faster than this (m/s)
+    :param min_distance: Meters of observed travel needed to trust a segment
+    :return: Number of stops updated
+    """
+    config = current_app.config
+    end = int(time.time())
+    start = end - days * 86400
+    max_offset = config.get('ETA_MAX_OFF_ROUTE', 150)
+    updated = 0
+
+    for route in BusRoute.query.all():
+        stops = list(route.stops)
+        if len(stops) < 2:
+            continue
+        model = RouteModel(route)
+        seg_time = [0.0] * len(stops)
+        seg_dist = [0.0] * len(stops)
+
+        for bus in BusLocation.query.filter_by(route=route.name).all():
+            prev = None
+            for ts, lat_e5, lng_e5 in iter_track(bus.id, start, end):
+                along, offset = model.snap(lat_e5 / 1e5, lng_e5 / 1e5)
+                if offset > max_offset:
+                    prev = None
+                    continue
+                if prev is not None:
+                    dt, dd = ts - prev[0], along - prev[1]
+                    if 0 < dt <= max_gap and 0 < dd <= max_speed * dt:
+                        k = model.segment_index((along + prev[1]) / 2)
+                        if k or model.is_loop:
+                            seg_time[k] += dt
+                            seg_dist[k] += dd
+                prev = (ts, along)
+
+        for k, stop in enumerate(stops):
+            if seg_dist[k] < min_distance:
+                continue
+            if k == 0:
+                span = model.length - model.stop_along[-1] + model.stop_along[0]
+            else:
+                span = model.stop_along[k] - model.stop_along[k - 1]
+            stop.travel_seconds = round(seg_time[k] / seg_dist[k] * span + config.get('ETA_STOP_DWELL', 20))
+            updated += 1
+
+    db.session.commit()
+    eta_engine.invalidate()
+    return updated
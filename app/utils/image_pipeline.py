@@ -0,0 +1,374 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import secrets
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app
+from PIL import Image
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+from app import db
+from app.models import ImageAsset
+from app.utils.background import PeriodicTask
+from app.utils.cache import cache
+from app.utils.counters import increment
+from app.utils.s3_helper import process_image
+from app.utils.storage import get_storage, delete_later, image_url
+
+
+# Encoders for derivatives: format -> (content type, extension, save options)
+DERIVATIVE_FORMATS = {
+    'JPEG': ('image/jpeg', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'PNG': ('image/png', '.png', {'optimize': True}),
+    'WEBP': ('image/webp', '.webp', {'quality': 80, 'method': 4}),
+    'AVIF': ('image/avif', '.avif', {'quality': 60}),
+}
+
+
+def derivative_key(key, width, extension):
+    """Name of a derivative, next to the full-size image: photo.jpg -> photo-640w.webp"""
+    root, _ = os.path.splitext(key)
+    return f"{root}-{width}w{extension}"
+
+
+def render_derivatives(source_path, filename, output_path, widths, formats):
+    """
+    Resize and re-encode one staged original (runs in a worker process).
+    Writes the full-size copy to output_path, then each width narrower than
+    it in the fallback format and in every modern format (WebP, AVIF).
+    :param widths: Candidate derivative widths in pixels
+    :param formats: Modern formats to produce, e.g. ['WEBP']
+    :return: (content type and width of the full-size copy, [(width, content type, path), ...])
+    """
+    content_type = process_image(source_path, filename, output_path)
+    fallback = 'PNG' if content_type == 'image/png' else 'JPEG'
+
+    variants = []
+    with Image.open(output_path) as full:
+        full.load()
+        full_width = full.width
+        for width in sorted({w for w in widths if w < full.width} | {full.width}):
+            if width == full.width:
+                resized = full
+            else:
+                resized = full.resize((width, max(1, round(full.height * width / full.width))),
+                                      Image.Resampling.LANCZOS)
+            for fmt in [fallback] + list(formats):
+                if fmt == fallback and width == full.width:
+                    continue  # that's the full-size copy itself
+                mime, extension, options = DERIVATIVE_FORMATS[fmt]
+                image = resized
+                if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                path = f"{output_path}-{width}{extension}"
+                image.save(path, format=fmt, **options)
+                variants.append((width, mime, path))
+    return content_type, full_width, variants
+
+
+def stage_upload(stream, path, chunk_size=64 * 1024):
+    """
+    Copy an upload to disk in chunks, hashing it on the way
+    :return: Hex SHA-256 of the content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def modern_formats():
+    """Modern formats this Pillow build can write, in order of preference"""
+    Image.init()
+    return [fmt for fmt in ('AVIF', 'WEBP') if fmt in Image.SAVE]
+
+
+def asset_session():
+    """
+    A session of its own for ImageAsset bookkeeping, which has to be
+    committed straight away (the background job looks the asset up) without
+    also committing whatever the calling request hasn't saved yet
+    """
+    return db.session.session_factory()
+
+
+class ImagePipeline:
+    """
+    Moves image processing out of the editor request. save() writes the
+    upload to a staging directory, records an ImageAsset in the 'pending'
+    state and returns the final image_file value straight away. Decoding,
+    resizing and re-encoding run in a process pool (they are CPU bound and
+    would hold the GIL) and produce the full-size copy plus narrower WebP
+    (and AVIF, where supported) derivatives; a small thread pool then
+    pushes everything to the storage backend, records the derivative manifest and
+    marks the asset ready. Pages show a placeholder meanwhile. Assets still
+    pending after IMAGE_PENDING_TIMEOUT (a worker restarted mid-job) are
+    picked up again by recover().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = None
+        self.threads = None
+        self.app = None
+
+    def start(self, app):
+        """Create the pools on first use, so each gunicorn worker gets its own after forking"""
+        if self.processes is not None:
+            return
+        with self.lock:
+            if self.processes is None:
+                self.app = app
+                # Spawned (not forked) children: the parent has running threads
+                self.processes = ProcessPoolExecutor(app.config.get('IMAGE_WORKERS', 2),
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self.threads = ThreadPoolExecutor(app.config.get('IMAGE_UPLOAD_THREADS', 2),
+                                                  thread_name_prefix='image-upload')
+
+    def save(self, form_image, folder='uploads'):
+        """
+        Stage an uploaded image for processing. An image identical to one
+        already stored (same SHA-256) is not processed again: the existing
+        asset gains a reference and its URL is returned.
+        :param form_image: Uploaded FileStorage
+        :param folder: Storage folder, e.g. 'blog_pics'
+        :return: Value to store in the model's image_file column
+        """
+        config = current_app.config
+        filename = secure_filename(form_image.filename) or 'image.jpg'
+
+        staging_dir = config['IMAGE_STAGING_DIR']
+        os.makedirs(staging_dir, exist_ok=True)
+        upload_path = os.path.join(staging_dir, f"{secrets.token_hex(8)}.upload")
+        content_hash = stage_upload(form_image.stream, upload_path)
+
+        with asset_session() as session:
+            existing = self._reuse(session, content_hash)
+            if existing is not None:
+                os.remove(upload_path)
+                return existing
+
+            # Decide the final URL now so the caller can save its row immediately
+            storage_key = f"{folder}/{uuid.uuid4().hex}_{filename}"
+            url = get_storage().url_for(storage_key)
+            asset = ImageAsset(key=url, folder=folder, status='pending', content_hash=content_hash, ref_count=1)
+            session.add(asset)
+            try:
+                session.commit()
+            except IntegrityError:
+                # The same image was uploaded concurrently and won the insert
+                session.rollback()
+                existing = self._reuse(session, content_hash)
+                if existing is not None:
+                    os.remove(upload_path)
+                    return existing
+                raise
+            job = self._job(asset.id, storage_key)
+            cache.invalidate('images', session=session)
+
+        # Named after the asset, so recover() can find it after a restart
+        os.replace(upload_path, job[2])
+        self._submit(job)
+        return url
+
+    @staticmethod
+    def _job(asset_id, storage_key):
+        # (asset id, original filename, staged original, processed output, storage key)
+        staging_dir = current_app.config['IMAGE_STAGING_DIR']
+        filename = os.path.basename(storage_key).split('_', 1)[-1]
+        return (asset_id, filename, os.path.join(staging_dir, f"asset-{asset_id}.orig"),
+                os.path.join(staging_dir, f"asset-{asset_id}.out"), storage_key)
+
+    def _submit(self, job):
+        # Process a staged original, in the background unless IMAGE_PIPELINE_ASYNC is off
+        config = current_app.config
+        _, filename, source_path, output_path, _ = job
+        args = (source_path, filename, output_path, config.get('IMAGE_WIDTHS', ()),
+                [fmt for fmt in modern_formats() if fmt in config.get('IMAGE_FORMATS', ())])
+        if not config.get('IMAGE_PIPELINE_ASYNC', True):
+            self._finish(job, render_derivatives(*args))
+            return
+
+        self.start(current_app._get_current_object())
+        future = self.processes.submit(render_derivatives, *args)
+        future.add_done_callback(lambda f: self.threads.submit(self._complete, job, f))
+
+    @staticmethod
+    def _reuse(session, content_hash):
+        """Take a reference to the asset with this content, if there is a usable one: its key, or None"""
+        asset = session.query(ImageAsset).filter_by(content_hash=content_hash).first()
+        if asset is None:
+            return None
+        if asset.status == 'failed':
+            # Let this upload try again under a new asset
+            session.query(ImageAsset).filter_by(id=asset.id).update({'content_hash': None})
+            session.commit()
+            return None
+        # Fails if release() deleted the asset in the meantime
+        if not increment(ImageAsset.ref_count, asset.id, session=session):
+            session.rollback()
+            return None
+        session.commit()
+        return asset.key
+
+    def release(self, key):
+        """
+        Drop one reference to a stored image; once no row uses it, delete
+        the asset and (in the background) its files and derivatives
+        """
+        with asset_session() as session:
+            asset = session.query(ImageAsset).filter_by(key=key).first()
+            if asset is None:
+                delete_later(key)  # uploaded before assets were recorded
+                return
+            manifest = json.loads(asset.derivatives) if asset.derivatives else []
+            increment(ImageAsset.ref_count, asset.id, -1, session=session)
+            # Conditional, so an upload that re-referenced the asset meanwhile keeps it
+            deleted = session.query(ImageAsset).filter(ImageAsset.id == asset.id, ImageAsset.ref_count <= 0) \
+                .delete(synchronize_session=False)
+            session.commit()
+            if deleted:
+                delete_later(key, *[variant for _, _, variant in manifest])
+                cache.invalidate('images', session=session)
+
+    def recover(self):
+        """
+        Pick up assets left pending for longer than IMAGE_PENDING_TIMEOUT,
+        e.g. by a worker restarted mid-job: those whose staged original is
+        still on disk are processed again, the rest are marked failed
+        :return: (number requeued, number failed)
+        """
+        timeout = current_app.config.get('IMAGE_PENDING_TIMEOUT', 600)
+        storage = get_storage()
+        requeued = failed = 0
+        with asset_session() as session:
+            cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+            stale = or_(ImageAsset.updated_at.is_(None), ImageAsset.updated_at < cutoff)
+            rows = session.query(ImageAsset.id, ImageAsset.key) \
+                .filter(ImageAsset.status == 'pending', stale).all()
+            for asset_id, key in rows:
+                # Claim the asset (restarting its timeout) so only one worker retries it
+                claimed = session.query(ImageAsset) \
+                    .filter(ImageAsset.id == asset_id, ImageAsset.status == 'pending', stale) \
+                    .update({'updated_at': datetime.utcnow()}, synchronize_session=False)
+                session.commit()
+                if not claimed:
+                    continue
+                storage_key = storage.key_for(key)
+                job = self._job(asset_id, storage_key) if storage_key else None
+                if job and os.path.exists(job[2]):
+                    self._submit(job)
+                    requeued += 1
+                else:
+                    self._mark(asset_id, 'failed')
+                    failed += 1
+            if failed:
+                cache.invalidate('images', session=session)
+        return requeued, failed
+
+    def _complete(self, job, future):
+        with self.app.app_context():
+            try:
+                result = future.result()
+            except Exception:
+                print(f"Image processing error: {traceback.format_exc()}")
+                self._mark(job[0], 'failed')
+                self._cleanup(job)
+                cache.invalidate('images')
+                return
+            try:
+                self._finish(job, result)
+            except Exception:
+                print(f"Image storage error: {traceback.format_exc()}")
+                self._mark(job[0], 'failed')
+                self._cleanup(job, [path for _, _, path in result[2]])
+            cache.invalidate('images')
+
+    def _finish(self, job, result):
+        # Push the processed files to storage and mark the asset ready
+        asset_id, _, _, output_path, storage_key = job
+        content_type, full_width, variants = result
+        with asset_session() as session:
+            asset = session.get(ImageAsset, asset_id)
+            if asset is None:
+                # Released while it was being processed; nothing refers to it
+                self._cleanup(job, [path for _, _, path in variants])
+                return
+            storage = get_storage()
+
+            manifest = [[full_width, content_type, storage.put_path(output_path, storage_key, content_type)]]
+            for width, mime, path in variants:
+                key = derivative_key(storage_key, width, os.path.splitext(path)[1])
+                manifest.append([width, mime, storage.put_path(path, key, mime)])
+
+            self._cleanup(job, [path for _, _, path in variants])
+            asset.derivatives = json.dumps(manifest, separators=(',', ':'))
+            asset.status = 'ready'
+            session.commit()
+
+    @staticmethod
+    def _mark(asset_id, status):
+        with asset_session() as session:
+            session.query(ImageAsset).filter_by(id=asset_id).update({'status': status})
+            session.commit()
+
+    @staticmethod
+    def _cleanup(job, extra=()):
+        for path in list(job[2:4]) + list(extra):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+image_pipeline = ImagePipeline()
+image_recovery = PeriodicTask('image-recovery', image_pipeline.recover, run_on_exit=False)
+
+
+def image_assets():
+    """
+    {key: (status, derivative manifest)} for every recorded image, cached
+    and invalidated by the 'images' tag so templates never query per image
+    """
+    config = current_app.config
+    # Started here, on the first page with images, so each worker checks for stale assets
+    image_recovery.start(current_app._get_current_object(), config.get('IMAGE_RECOVERY_INTERVAL', 60))
+
+    def load():
+        return {
+            key: (status, json.loads(derivatives) if derivatives else [])
+            for key, status, derivatives in
+            db.session.query(ImageAsset.key, ImageAsset.status, ImageAsset.derivatives)
+        }
+    return cache.get_or_set('images:assets', ['images'], config.get('PAGE_CACHE_TTL', 300), load)
+
+
+def image_sources(image_path, folder):
+    """
+    srcset strings for an image's derivatives
+    :param folder: Static folder of local images, e.g. 'blog_pics/'
+    :return: {'sources': [(content type, srcset)], 'srcset': fallback srcset},
+             or None if the image has no derivatives
+    """
+    asset = image_assets().get(image_path)
+    if not asset or asset[0] != 'ready' or not asset[1]:
+        return None
+
+    by_type = {}
+    for width, mime, key in asset[1]:
+        by_type.setdefault(mime, []).append(f"{image_url(key, folder)} {width}w")
+    fallback = by_type.pop('image/jpeg', None) or by_type.pop('image/png', [])
+    return {
+        # Browsers take the first <source> they support, so best format first
+        'sources': [(mime, ', '.join(by_type[mime])) for mime in ('image/avif', 'image/webp') if mime in by_type],
+        'srcset': ', '.join(fallback),
+    }
@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import current_app
+from app import db
+from app.models import FohContestant
+from app.utils.broadcast import Broadcaster
+from app.utils.cache import cache
+
+# Push channel for the live leaderboard; each verified vote is published once
+# and fanned out to every connected viewer in this process
+leaderboard_channel = Broadcaster()
+
+
+class Leaderboard:
+    """
+    Active Face of HESA contestants ranked by votes, held in memory.
+    Ranks are kept as a sorted list of (-votes, id) keys, so crediting a
+    verified vote moves one contestant with two binary searches instead of
+    re-querying and re-sorting everyone. The table is reloaded from the
+    database every LEADERBOARD_REFRESH seconds, which also picks up votes
+    verified by other worker processes, and as soon as the shared
+    'leaderboard' cache tag is bumped by invalidate() in any process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        self.entries = {}
+        self.loaded_at = None
+        self.version = None
+        self._encoded = None
+
+    def _load(self):
+        rows = db.session.query(FohContestant.id, FohContestant.name, FohContestant.description,
+                                FohContestant.image_file, FohContestant.votes) \
+            .filter_by(is_active=True) \
+            .all()
+        self.entries = {
+            row.id: {'id': row.id, 'name': row.name, 'description': row.description,
+                     'image_file': row.image_file, 'votes': row.votes or 0}
+            for row in rows
+        }
+        self.keys = sorted((-entry['votes'], entry['id']) for entry in self.entries.values())
+        self.loaded_at = time.monotonic()
+        self._encoded = None
+
+    def _refresh(self):
+        ttl = current_app.config.get('LEADERBOARD_REFRESH', 5)
+        version = cache.tag_versions().get('leaderboard', 0)
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= ttl or version != self.version:
+            self._load()
+            self.version = version
+
+    def ranking(self):
+        """Contestant dicts, most votes first"""
+        with self.lock:
+            self._refresh()
+            return [self.entries[contestant_id] for _, contestant_id in self.keys]
+
+    def encoded(self):
+        """
+        Serialized leaderboard for the JSON API
+        :return: (body bytes, etag)
+        """
+        with self.lock:
+            self._refresh()
+            if self._encoded is None:
+                data = [{'id': contestant_id, 'name': self.entries[contestant_id]['name'], 'votes': -votes}
+                        for votes, contestant_id in self.keys]
+                body = current_app.json.dumps(data, separators=(',', ':')).encode('utf-8')
+                self._encoded = (body, hashlib.sha1(body).hexdigest())
+            return self._encoded
+
+    def add_votes(self, contestant_id, amount):
+        """
+        Credit votes that were just committed and push the new total
+        :return: The contestant's new vote total, or None if it isn't ranked
+        """
+        with self.lock:
+            entry = self.entries.get(contestant_id)
+            if entry is None:
+                return None
+            i = bisect_left(self.keys, (-entry['votes'], contestant_id))
+            if i < len(self.keys) and self.keys[i] == (-entry['votes'], contestant_id):
+                del self.keys[i]
+            entry['votes'] += amount
+            insort(self.keys, (-entry['votes'], contestant_id))
+            self._encoded = None
+            votes = entry['votes']
+        leaderboard_channel.publish('votes', {'id': contestant_id, 'votes': votes})
+        return votes
+
+    def invalidate(self):
+        """
+        Reload from the database on the next read, in every process; call
+        after contestant edits are committed
+        """
+        self.loaded_at = None
+        cache.invalidate('leaderboard')
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+
+class LocalS3Client:
+    """
+    Filesystem stand-in for the subset of the boto3 S3 client the app uses.
+    Each bucket is a directory under `root` and each key a file, so uploads,
+    deletes and listings can be exercised (tests, local development,
+    benchmarks) without AWS credentials or network access. Enabled by
+    setting S3_LOCAL_ROOT.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket, key):
+        path = os.path.normpath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.normpath(os.path.join(self.root, bucket)) + os.sep):
+            raise ValueError(f"Invalid key: {key}")
+        return path
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so readers never see a partial object
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(Fileobj, f, 1024 * 1024)
+        os.replace(tmp_path, path)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if isinstance(Body, (bytes, bytearray)):
+            path = self._path(Bucket, Key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(Body)
+        else:
+            self.upload_fileobj(Body, Bucket, Key)
+        return {}
+
+    def head_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(Key)
+        stat = os.stat(path)
+        return {'ContentLength': stat.st_size,
+                'LastModified': datetime.fromtimestamp(stat.st_mtime, timezone.utc)}
+
+    def delete_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if os.path.isfile(path):
+            os.remove(path)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        deleted = []
+        for obj in Delete.get('Objects', []):
+            self.delete_object(Bucket, obj['Key'])
+            deleted.append({'Key': obj['Key']})
+        return {'Deleted': deleted}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, StartAfter=None):
+        bucket_root = os.path.join(self.root, Bucket)
+        keys = []
+        for dirpath, _, filenames in os.walk(bucket_root):
+            for name in filenames:
+                if name.endswith('.part'):
+                    continue
+                key = os.path.relpath(os.path.join(dirpath, name), bucket_root).replace(os.sep, '/')
+                if key.startswith(Prefix):
+                    keys.append(key)
+        keys.sort()
+
+        after = ContinuationToken or StartAfter
+        if after:
+            keys = [key for key in keys if key > after]
+        page, more = keys[:MaxKeys], len(keys) > MaxKeys
+
+        contents = []
+        for key in page:
+            head = self.head_object(Bucket, key)
+            contents.append({'Key': key, 'Size': head['ContentLength'], 'LastModified': head['LastModified']})
+        response = {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': more}
+        if more:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def get_paginator(self, operation):
+        if operation != 'list_objects_v2':
+            raise NotImplementedError(operation)
+        return _ListPaginator(self)
+
+
+class _ListPaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix='', PaginationConfig=None):
+        page_size = (PaginationConfig or {}).get('PageSize', 1000)
+        token = None
+        while True:
+            page = self.client.list_objects_v2(Bucket=Bucket, Prefix=Prefix, MaxKeys=page_size,
+                                               ContinuationToken=token)
+            yield page
+            if not page['IsTruncated']:
+                break
+            token = page['NextContinuationToken']
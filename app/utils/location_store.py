@@ -0,0 +1,177 @@
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import bindparam, or_, update
+from app import db
+from app.models import BusLocation
+from app.utils.background import PeriodicTask
+from app.utils.position_history import history_rows, insert_history, prune_position_history
+
+
+class MemoryLocationStore:
+    """
+    Hot store for the latest position of each bus, keyed by BusLocation.id.
+    Each entry is a small hash of latitude/longitude/last_update, the same
+    layout a Redis HSET per bus would use, so the store can be swapped for a
+    shared one without touching the callers. Writes are O(1) and only mark
+    the bus dirty; the flusher persists dirty buses to the database.
+    """
+
+    def __init__(self):
+        self._positions = {}
+        self._dirty = set()
+        self._track = []
+        self._last_track_ts = {}
+        self._lock = threading.Lock()
+
+    def set_position(self, bus_pk, latitude, longitude, last_update):
+        with self._lock:
+            self._positions[bus_pk] = {
+                'latitude': latitude,
+                'longitude': longitude,
+                'last_update': last_update
+            }
+            self._dirty.add(bus_pk)
+
+    def get_position(self, bus_pk):
+        return self._positions.get(bus_pk)
+
+    def all_positions(self):
+        with self._lock:
+            return dict(self._positions)
+
+    def discard(self, bus_pk):
+        """Forget a bus, e.g. after its position was edited directly in the database"""
+        with self._lock:
+            self._positions.pop(bus_pk, None)
+            self._dirty.discard(bus_pk)
+
+    def pop_dirty(self):
+        """Return {bus_pk: position} for buses changed since the last call"""
+        with self._lock:
+            dirty = {pk: self._positions[pk] for pk in self._dirty if pk in self._positions}
+            self._dirty.clear()
+            return dirty
+
+    def append_track(self, rows):
+        """Buffer history rows, skipping seconds already buffered for the bus"""
+        with self._lock:
+            for row in rows:
+                if row['ts'] > self._last_track_ts.get(row['bus_pk'], -1):
+                    self._track.append(row)
+                    self._last_track_ts[row['bus_pk']] = row['ts']
+
+    def pop_track(self):
+        with self._lock:
+            rows, self._track = self._track, []
+            return rows
+
+    def requeue_track(self, rows):
+        with self._lock:
+            self._track[:0] = rows
+
+    def mark_dirty(self, bus_pks):
+        """Re-queue buses whose flush failed"""
+        with self._lock:
+            self._dirty.update(pk for pk in bus_pks if pk in self._positions)
+
+
+location_store = MemoryLocationStore()
+
+# Positions only move forward: another worker may already have flushed a
+# newer fix for the bus, which an older buffered one must not overwrite
+_bus_table = BusLocation.__table__
+_position_update = update(_bus_table) \
+    .where(_bus_table.c.id == bindparam('pk'),
+           or_(_bus_table.c.last_update.is_(None), _bus_table.c.last_update < bindparam('ts'))) \
+    .values(latitude=bindparam('lat'), longitude=bindparam('lng'), last_update=bindparam('ts'))
+
+
+def flush_locations():
+    """
+    Persist the latest position of every dirty bus in one bulk UPDATE
+    (skipping buses whose stored position is already newer) and append
+    buffered fixes to the position history in one bulk INSERT
+    """
+    dirty = location_store.pop_dirty()
+    track = location_store.pop_track()
+    if not dirty and not track:
+        return 0
+
+    try:
+        if dirty:
+            db.session.execute(_position_update, [
+                {'pk': pk, 'lat': position['latitude'], 'lng': position['longitude'],
+                 'ts': position['last_update']} for pk, position in dirty.items()
+            ])
+        insert_history(track)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        location_store.mark_dirty(dirty.keys())
+        location_store.requeue_track(track)
+        raise
+    finally:
+        db.session.remove()
+    
+    _maybe_prune_history()
+    return len(dirty)
+
+
+_last_prune = 0
+
+
+def _maybe_prune_history():
+    # Drop whole days of history past the retention window, at most hourly
+    global _last_prune
+    keep_days = current_app.config.get('POSITION_HISTORY_DAYS')
+    if not keep_days or time.monotonic() - _last_prune < 3600:
+        return
+    _last_prune = time.monotonic()
+    try:
+        prune_position_history(keep_days)
+    finally:
+        db.session.remove()
+
+
+location_flusher = PeriodicTask('location-flusher', flush_locations)
+
+
+def record_fixes(bus, fixes):
+    """
+    Record new fixes for a bus from the driver ingestion path.
+    The newest fix becomes the bus's current position and every fix is
+    appended to the position history. With LOCATION_WRITE_BEHIND enabled
+    both go to the in-memory store and are flushed every
+    LOCATION_FLUSH_INTERVAL seconds; otherwise they are committed straight away.
+    :param bus: BusLocation being tracked
+    :param fixes: (timestamp_seconds, latitude, longitude) tuples, oldest first
+    """
+    config = current_app.config
+    t, latitude, longitude = fixes[-1]
+    last_update = datetime.utcfromtimestamp(t)
+    
+    # History is keyed by whole seconds; skip the second already recorded
+    previous = current_position(bus)[2]
+    floor = int(previous.replace(tzinfo=timezone.utc).timestamp()) if previous else -1
+    rows = [row for row in history_rows(bus.id, fixes) if row['ts'] > floor]
+    
+    if config.get('LOCATION_WRITE_BEHIND', True):
+        location_store.set_position(bus.id, latitude, longitude, last_update)
+        location_store.append_track(rows)
+        location_flusher.start(current_app._get_current_object(), config.get('LOCATION_FLUSH_INTERVAL', 5))
+    else:
+        bus.latitude = latitude
+        bus.longitude = longitude
+        bus.last_update = last_update
+        insert_history(rows)
+        db.session.commit()
+
+
+def current_position(bus):
+    """Latest known (latitude, longitude, last_update) for a bus, store first"""
+    position = location_store.get_position(bus.id)
+    if position is not None and (bus.last_update is None or position['last_update'] >= bus.last_update):
+        return position['latitude'], position['longitude'], position['last_update']
+    return bus.latitude, bus.longitude, bus.last_update
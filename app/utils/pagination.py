@@ -0,0 +1,109 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, tuple_
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor that wasn't produced by encode_cursor"""
+
+
+def encode_cursor(values):
+    """Encode a row's sort key as an opaque, URL-safe cursor"""
+    data = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    """
+    Decode a cursor produced by encode_cursor
+    :return: List of values, or None if the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(data, list) or len(data) != len(columns):
+            return None
+        values = []
+        for value, (column, _) in zip(data, columns):
+            if column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            elif column.type.python_type is int:
+                value = int(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError, OverflowError, NotImplementedError):
+        return None
+
+
+def _after(columns, values, reverse=False):
+    # WHERE clause selecting rows that sort after `values` in the given order
+    directions = {desc != reverse for _, desc in columns}
+    if len(directions) == 1:
+        # Same direction on every column: a row-value comparison the index can seek on
+        cols = tuple_(*[c for c, _ in columns])
+        return cols < tuple_(*values) if directions.pop() else cols > tuple_(*values)
+
+    clauses = []
+    for i, ((column, desc), value) in enumerate(zip(columns, values)):
+        equal = [c == v for (c, _), v in zip(columns[:i], values[:i])]
+        step = column < value if desc != reverse else column > value
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """One page of keyset (cursor) pagination results"""
+
+    def __init__(self, items, has_prev, has_next, columns, total=None):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.total = total
+        self._columns = columns
+
+    def _key(self, item):
+        return encode_cursor([getattr(item, column.key) for column, _ in self._columns])
+
+    @property
+    def prev_cursor(self):
+        return self._key(self.items[0]) if self.items and self.has_prev else None
+
+    @property
+    def next_cursor(self):
+        return self._key(self.items[-1]) if self.items and self.has_next else None
+
+
+def keyset_paginate(query, columns, per_page, after=None, before=None, total=None):
+    """
+    Paginate a query by its sort key instead of OFFSET, so every page costs
+    the same however deep it is. The columns must identify rows uniquely
+    (end with the primary key) and be backed by an index in the same order.
+    :param columns: List of (column, descending) pairs defining the order
+    :param after: Cursor of the last row of the previous page
+    :param before: Cursor of the first row of the next page (going back)
+    :param total: Optional total row count to expose on the page
+    :return: KeysetPage
+    :raises InvalidCursor: If a cursor is malformed
+    """
+    backwards = bool(before)
+    cursor = None
+    token = before or after
+    if token:
+        cursor = decode_cursor(token, columns)
+        # Restarting at page 1 would hand the client the same cursor back forever
+        if cursor is None or any(value is None for value in cursor):
+            raise InvalidCursor(token)
+
+    if cursor is not None:
+        query = query.filter(_after(columns, cursor, reverse=backwards))
+
+    order = [(c.asc() if desc == backwards else c.desc()) for c, desc in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        return KeysetPage(rows, has_prev=more, has_next=True, columns=columns, total=total)
+    return KeysetPage(rows, has_prev=cursor is not None, has_next=more, columns=columns, total=total)
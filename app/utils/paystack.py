@@ -0,0 +1,53 @@
+import hashlib
+import hmac
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+from flask import current_app
+
+
+class GatewayError(Exception):
+    """Paystack could not be reached or gave an unusable answer; worth retrying"""
+
+
+def verify_transaction(reference):
+    """
+    Look up a transaction with the Paystack verify API
+    Without PAYSTACK_SECRET_KEY (local development) every transaction is
+    reported successful, which keeps the demo payment flow working.
+    :param reference: Transaction reference
+    :return: (status, amount in kobo) - status is Paystack's, e.g. 'success',
+             'failed', 'abandoned'; amount is None when not known
+    :raises GatewayError: On network errors, timeouts and 5xx responses
+    """
+    secret = current_app.config.get('PAYSTACK_SECRET_KEY')
+    if not secret:
+        return 'success', None
+
+    url = f"{current_app.config['PAYSTACK_API_URL']}/transaction/verify/{urllib.parse.quote(reference)}"
+    req = urllib.request.Request(url, headers={'Authorization': f'Bearer {secret}'})
+    try:
+        with urllib.request.urlopen(req, timeout=current_app.config.get('PAYSTACK_TIMEOUT', 10)) as response:
+            payload = json.load(response)
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            # Paystack has never seen this reference (payment not started)
+            return 'not_found', None
+        if e.code >= 500 or e.code == 429:
+            raise GatewayError(f"Paystack returned {e.code}") from e
+        return 'error', None
+    except (urllib.error.URLError, TimeoutError, ValueError) as e:
+        raise GatewayError(str(e)) from e
+
+    data = payload.get('data') or {}
+    return data.get('status', 'error'), data.get('amount')
+
+
+def valid_signature(body, signature):
+    """Check the X-Paystack-Signature header (HMAC-SHA512 of the raw body)"""
+    secret = current_app.config.get('PAYSTACK_SECRET_KEY')
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
@@ -0,0 +1,113 @@
+import time
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from app.models import BusLocation, BusPositionHistory
+
+
+def history_rows(bus_pk, fixes):
+    """
+    Convert (timestamp_seconds, latitude, longitude) fixes into history rows.
+    Several fixes within the same second collapse to the last one.
+    """
+    rows = {}
+    for t, lat, lng in fixes:
+        ts = int(t)
+        rows[ts] = {'bus_pk': bus_pk, 'ts': ts, 'lat_e5': round(lat * 1e5), 'lng_e5': round(lng * 1e5)}
+    return list(rows.values())
+
+
+def insert_history(rows):
+    """
+    Bulk insert history rows with a single executemany (no commit).
+    A row whose (bus_pk, ts) is already recorded, e.g. by another worker,
+    is skipped rather than failing the whole batch.
+    """
+    if not rows:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        stmt = sqlite_insert(BusPositionHistory).on_conflict_do_nothing()
+    elif dialect == 'postgresql':
+        stmt = postgresql_insert(BusPositionHistory).on_conflict_do_nothing()
+    else:
+        stmt = insert(BusPositionHistory)
+    db.session.execute(stmt, rows)
+
+
+def prune_position_history(keep_days):
+    """
+    Delete history older than keep_days whole days (UTC).
+    Deletes run per bus so each one is a range on the (bus_pk, ts) key.
+    :return: Number of rows deleted
+    """
+    cutoff = (int(time.time()) // 86400 - keep_days) * 86400
+    deleted = 0
+    for (bus_pk,) in db.session.execute(select(BusLocation.id)).all():
+        result = db.session.execute(
+            delete(BusPositionHistory)
+            .where(BusPositionHistory.bus_pk == bus_pk, BusPositionHistory.ts < cutoff)
+        )
+        deleted += result.rowcount
+    db.session.commit()
+    return deleted
+
+
+def iter_track(bus_pk, start, end, batch_size=2000):
+    """
+    Stream (ts, lat_e5, lng_e5) tuples for a bus between start and end
+    (inclusive, epoch seconds) without loading the whole window at once
+    """
+    stmt = select(BusPositionHistory.ts, BusPositionHistory.lat_e5, BusPositionHistory.lng_e5) \
+        .where(BusPositionHistory.bus_pk == bus_pk,
+               BusPositionHistory.ts >= start,
+               BusPositionHistory.ts <= end) \
+        .order_by(BusPositionHistory.ts) \
+        .execution_options(yield_per=batch_size)
+    for row in db.session.execute(stmt):
+        yield row.ts, row.lat_e5, row.lng_e5
+
+
+def _encode_value(value):
+    # Google encoded polyline algorithm for a single signed integer
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(points):
+    """
+    Encode (lat_e5, lng_e5) points as a Google encoded polyline (precision 5),
+    yielding one fragment per point so long tracks can be streamed
+    """
+    prev_lat = prev_lng = 0
+    for lat_e5, lng_e5 in points:
+        yield _encode_value(lat_e5 - prev_lat) + _encode_value(lng_e5 - prev_lng)
+        prev_lat, prev_lng = lat_e5, lng_e5
+
+
+def decode_polyline(text):
+    """Decode a Google encoded polyline (precision 5) into (lat, lng) floats"""
+    points = []
+    index = lat = lng = 0
+    while index < len(text):
+        deltas = []
+        for _ in range(2):
+            result = shift = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / 1e5, lng / 1e5))
+    return points
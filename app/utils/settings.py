@@ -0,0 +1,43 @@
+import json
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import SiteSetting
+from app.utils.cache import cache
+
+# Values used until a setting is first saved
+DEFAULTS = {
+    'foh.voting_active': True,
+    'foh.vote_cost': 1.0,  # GHS per vote
+}
+
+
+def _load_settings():
+    return {name: json.loads(value) for name, value in db.session.query(SiteSetting.name, SiteSetting.value)}
+
+
+def get_setting(name):
+    """
+    Read a setting. All settings are loaded with one query and kept in the
+    tagged cache, so reads are a dict lookup; a change made in any worker
+    is seen everywhere within CACHE_TAG_CHECK_INTERVAL seconds.
+    """
+    settings = cache.get_or_set('settings', ['settings'],
+                                current_app.config.get('SETTINGS_CACHE_TTL', 300), _load_settings)
+    return settings.get(name, DEFAULTS.get(name))
+
+
+def set_setting(name, value):
+    """Save a setting and invalidate every process's cached copy"""
+    encoded = json.dumps(value)
+    updated = SiteSetting.query.filter_by(name=name).update({'value': encoded})
+    if not updated:
+        db.session.add(SiteSetting(name=name, value=encoded))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker inserted the row first; overwrite it
+        db.session.rollback()
+        SiteSetting.query.filter_by(name=name).update({'value': encoded})
+        db.session.commit()
+    cache.invalidate('settings')
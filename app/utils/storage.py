@@ -0,0 +1,233 @@
+import os
+import shutil
+import threading
+import traceback
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from app.utils.s3_helper import get_s3_client, put_file_to_s3
+
+
+class StorageBackend:
+    """
+    Where uploaded files live. Files are addressed by a key such as
+    'blog_pics/3f2a..._photo.jpg'; put() returns the public URL, which is
+    what models store, so pages never have to work out where a file is.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def url_for(self, key):
+        return self.base_url + key
+
+    def key_for(self, url):
+        """Key of a URL this backend issued, or None for anything else"""
+        if url and url.startswith(self.base_url):
+            return url[len(self.base_url):]
+        return None
+
+    def put(self, fileobj, key, content_type):
+        """
+        Store a file
+        :param fileobj: File object positioned at the start of the data
+        :return: Public URL of the stored file
+        """
+        self._write(fileobj, key, content_type)
+        return self.url_for(key)
+
+    def put_path(self, path, key, content_type):
+        """Store a file from disk (the file may be moved rather than copied)"""
+        with open(path, 'rb') as f:
+            return self.put(f, key, content_type)
+
+    def delete(self, *urls):
+        """
+        Delete files by URL in one batch; URLs from elsewhere (default
+        images, other backends) are ignored
+        :return: Number of files deleted
+        """
+        keys = [key for key in map(self.key_for, urls) if key]
+        if keys:
+            self._delete_keys(keys)
+        return len(keys)
+
+    def delete_keys(self, keys):
+        """Delete files by key in one batch"""
+        self._delete_keys(list(keys))
+
+    def list(self, prefix=''):
+        """Yield (key, size, last modified as an aware datetime) for every stored file under a prefix"""
+        raise NotImplementedError
+
+    def _write(self, fileobj, key, content_type):
+        raise NotImplementedError
+
+    def _delete_keys(self, keys):
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """Files under the app's static folder, served by Flask (development)"""
+
+    def __init__(self, root, base_url):
+        super().__init__(base_url)
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid key: {key}")
+        return path
+
+    def _write(self, fileobj, key, content_type):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so a half-written file is never served
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+        os.replace(tmp_path, path)
+
+    def put_path(self, path, key, content_type):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+        return self.url_for(key)
+
+    def _delete_keys(self, keys):
+        for key in keys:
+            path = self._path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def list(self, prefix=''):
+        top = os.path.join(self.root, prefix)
+        for dirpath, _, filenames in os.walk(top):
+            for name in filenames:
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(dirpath, name)
+                stat = os.stat(path)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                yield key, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+
+class S3Storage(StorageBackend):
+    """Files in the S3 bucket, through the shared per-process client"""
+
+    def __init__(self, bucket, base_url, acl="public-read"):
+        super().__init__(base_url)
+        self.bucket = bucket
+        self.acl = acl  # None for buckets with ACLs disabled
+
+    def _write(self, fileobj, key, content_type):
+        put_file_to_s3(fileobj, key, content_type, acl=self.acl)
+
+    def _delete_keys(self, keys):
+        client = get_s3_client()
+        # DeleteObjects takes at most 1000 keys per request
+        for i in range(0, len(keys), 1000):
+            objects = [{'Key': key} for key in keys[i:i + 1000]]
+            response = client.delete_objects(Bucket=self.bucket, Delete={'Objects': objects, 'Quiet': True})
+            for error in response.get('Errors', []):
+                print(f"S3 delete error: {error.get('Key')}: {error.get('Message')}")
+
+    def list(self, prefix=''):
+        # One page (up to 1000 keys) in memory at a time, however big the bucket
+        paginator = get_s3_client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], obj['Size'], obj['LastModified']
+
+
+class MemoryStorage(StorageBackend):
+    """Files held in a dict, for tests and benchmarks"""
+
+    def __init__(self, base_url='memory://'):
+        super().__init__(base_url)
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def _write(self, fileobj, key, content_type):
+        data = fileobj.read()
+        with self.lock:
+            self.files[key] = (data, content_type, datetime.now(timezone.utc))
+
+    def _delete_keys(self, keys):
+        with self.lock:
+            for key in keys:
+                self.files.pop(key, None)
+
+    def list(self, prefix=''):
+        with self.lock:
+            files = sorted(self.files.items())
+        for key, (data, _, modified) in files:
+            if key.startswith(prefix):
+                yield key, len(data), modified
+
+
+def create_storage(app):
+    """Build the backend named by STORAGE_BACKEND ('s3', 'local' or 'memory')"""
+    name = app.config.get('STORAGE_BACKEND') or ('s3' if app.config.get('USE_S3') else 'local')
+    if name == 's3':
+        return S3Storage(app.config.get('S3_BUCKET'), app.config.get('S3_LOCATION'))
+    if name == 'local':
+        return LocalStorage(app.static_folder, app.static_url_path + '/')
+    if name == 'memory':
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+_lock = threading.Lock()
+_delete_pool = None
+
+
+def get_storage():
+    """The app's storage backend (created on first use)"""
+    app = current_app._get_current_object()
+    storage = app.extensions.get('storage')
+    if storage is None:
+        with _lock:
+            storage = app.extensions.get('storage')
+            if storage is None:
+                storage = app.extensions['storage'] = create_storage(app)
+    return storage
+
+
+def delete_later(*urls):
+    """
+    Delete files in the background, so removing a post or photo doesn't
+    wait on storage round trips; failures are logged, not raised
+    """
+    global _delete_pool
+    urls = [url for url in urls if url]
+    if not urls:
+        return
+    app = current_app._get_current_object()
+    if not app.config.get('STORAGE_ASYNC_DELETE', True):
+        _delete(app, urls)
+        return
+    if _delete_pool is None:
+        with _lock:
+            if _delete_pool is None:
+                _delete_pool = ThreadPoolExecutor(1, thread_name_prefix='storage-delete')
+    _delete_pool.submit(_delete, app, urls)
+
+
+def _delete(app, urls):
+    with app.app_context():
+        try:
+            get_storage().delete(*urls)
+        except Exception:
+            print(f"Storage delete error: {traceback.format_exc()}")
+
+
+def image_url(image_file, folder):
+    """
+    URL of a stored image. New uploads already store their URL; older rows
+    hold a bare filename under a static folder, e.g. ('a1b2.jpg', 'blog_pics/')
+    """
+    if '://' in image_file or image_file.startswith('/'):
+        return image_file
+    return url_for('static', filename=folder.rstrip('/') + '/' + image_file)
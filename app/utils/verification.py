@@ -0,0 +1,178 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from app.models import FohVote
+from app.utils.background import PeriodicTask
+from app.utils.counters import verify_votes
+from app.utils.paystack import GatewayError, verify_transaction
+
+
+class VerificationQueue:
+    """
+    Background queue of FohVote references waiting for payment confirmation.
+    Request handlers only enqueue a reference; a small pool of worker
+    threads calls the gateway, retries failures with exponential backoff,
+    and records each batch of confirmed votes in one transaction. Jobs are
+    kept in a heap ordered by due time, so delayed retries and new work
+    share the same queue.
+
+    Payments reported by a signed webhook skip the gateway call and are
+    only batched into the database write.
+
+    The queue itself is only held in memory, so recover() re-submits recent
+    unverified votes from the database: on start and then every
+    VERIFY_RECOVERY_INTERVAL seconds, jobs lost to a restart (or given up
+    on) are picked up again.
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self.queued = {}
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.workers = []
+        self.app = None
+
+    def start(self, app):
+        """Start the worker threads if they aren't already running"""
+        if self.workers and all(worker.is_alive() for worker in self.workers):
+            return
+        with self.condition:
+            if self.workers and all(worker.is_alive() for worker in self.workers):
+                return
+            self.app = app
+            self.workers = [
+                threading.Thread(target=self._work, name=f'vote-verifier-{i}', daemon=True)
+                for i in range(app.config.get('VERIFY_WORKERS', 2))
+            ]
+            for worker in self.workers:
+                worker.start()
+        verification_recovery.start(app, app.config.get('VERIFY_RECOVERY_INTERVAL', 300))
+
+    def submit(self, reference, paid_amount=None, attempt=0, delay=0):
+        """
+        Queue a reference for verification
+        :param paid_amount: Amount in kobo when the payment is already known
+                            to be successful (signed webhook); the gateway
+                            isn't asked again
+        :param attempt: Number of failed gateway attempts so far
+        :param delay: Seconds to wait before processing
+        """
+        confirmed = paid_amount is not None
+        with self.condition:
+            # A reference already waiting is only upgraded, never duplicated
+            current = self.queued.get(reference)
+            if current is not None and (current or not confirmed):
+                return
+            self.queued[reference] = confirmed
+            heapq.heappush(self.jobs, (time.monotonic() + delay, next(self.counter), reference, paid_amount, attempt))
+            self.condition.notify()
+
+    def recover(self):
+        """
+        Queue every unverified vote from the last VERIFY_RECOVERY_WINDOW
+        seconds. References already waiting aren't duplicated, and
+        verify_votes credits a vote only once, so overlapping sweeps in
+        several workers are harmless.
+        :return: Number of references submitted
+        """
+        since = datetime.utcnow() - timedelta(seconds=self.app.config.get('VERIFY_RECOVERY_WINDOW', 86400))
+        references = [
+            reference for reference, in
+            FohVote.query.with_entities(FohVote.transaction_ref)
+            .filter(FohVote.verified.isnot(True), FohVote.created_at >= since)
+            .all()
+        ]
+        for reference in references:
+            self.submit(reference)
+        return len(references)
+
+    def pending(self):
+        with self.condition:
+            return len(self.queued)
+
+    def _take_batch(self, max_size):
+        # Block until at least one job is due, then take every due job up to max_size
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if self.jobs and self.jobs[0][0] <= now:
+                    break
+                self.condition.wait(self.jobs[0][0] - now if self.jobs else None)
+
+            batch = []
+            while self.jobs and self.jobs[0][0] <= now and len(batch) < max_size:
+                _, _, reference, paid_amount, attempt = heapq.heappop(self.jobs)
+                if self.queued.get(reference) is None or (self.queued[reference] and paid_amount is None):
+                    continue  # superseded by a confirmed job
+                del self.queued[reference]
+                batch.append((reference, paid_amount, attempt))
+            return batch
+
+    def _work(self):
+        while True:
+            batch = self._take_batch(self.app.config.get('VERIFY_BATCH_SIZE', 50))
+            if not batch:
+                continue
+            with self.app.app_context():
+                try:
+                    self.process(batch)
+                except Exception:
+                    print(f"Vote verification error: {traceback.format_exc()}")
+                    # Put the whole batch back; verify_votes is idempotent
+                    for reference, paid_amount, attempt in batch:
+                        self._retry(reference, paid_amount, attempt)
+
+    def _retry(self, reference, paid_amount, attempt):
+        config = self.app.config
+        if attempt + 1 >= config.get('VERIFY_MAX_ATTEMPTS', 6):
+            print(f"Giving up verifying payment {reference} after {attempt + 1} attempts")
+            return
+        delay = min(config.get('VERIFY_RETRY_BASE', 2) * 2 ** attempt, config.get('VERIFY_RETRY_MAX', 300))
+        self.submit(reference, paid_amount=paid_amount, attempt=attempt + 1, delay=delay)
+
+    def process(self, batch):
+        """
+        Verify a batch of (reference, paid_amount, attempt) jobs
+        :return: References that were newly verified
+        """
+        references = [reference for reference, _, _ in batch]
+        votes = {
+            vote.transaction_ref: vote for vote in
+            FohVote.query.filter(FohVote.transaction_ref.in_(references)).all()
+        }
+
+        paid = []
+        for reference, paid_amount, attempt in batch:
+            vote = votes.get(reference)
+            if vote is None or vote.verified:
+                continue
+
+            if paid_amount is not None:
+                status, amount = 'success', paid_amount
+            else:
+                try:
+                    status, amount = verify_transaction(reference)
+                except GatewayError as e:
+                    print(f"Paystack verify failed for {reference}: {e}")
+                    self._retry(reference, paid_amount, attempt)
+                    continue
+
+            if status == 'success':
+                # Never credit more votes than were paid for
+                if amount is not None and amount < round(vote.amount * 100):
+                    print(f"Payment {reference} underpaid: {amount} kobo for {vote.amount} GHS")
+                    continue
+                paid.append(reference)
+            elif status in ('pending', 'ongoing', 'processing', 'queued'):
+                self._retry(reference, paid_amount, attempt)
+
+        return verify_votes(paid)
+
+
+verification_queue = VerificationQueue()
+verification_recovery = PeriodicTask('vote-verification-recovery', verification_queue.recover,
+                                     run_on_exit=False, run_on_start=True)
@@ -0,0 +1,80 @@
+# benchmark_storage.py
+#
+# Compare storage backends on upload and delete throughput.
+#
+#   python benchmark_storage.py                          # memory, local and a filesystem-backed S3 stand-in
+#   python benchmark_storage.py --backends s3 --real-s3  # the configured bucket (uploads under benchmark/)
+#   python benchmark_storage.py --files 500 --size 2000 --threads 16
+#
+# Each backend stores --files objects of --size KB from --threads threads,
+# then removes them with one batched delete. Nothing touches the database.
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app
+from app.utils.storage import LocalStorage, MemoryStorage, S3Storage
+
+app = create_app()
+
+def make_backend(name, scratch_dir, real_s3):
+    if name == 'memory':
+        return MemoryStorage()
+    if name == 'local':
+        return LocalStorage(scratch_dir, '/static/')
+    if name == 's3':
+        if not real_s3:
+            # The S3 code path, with the client swapped for LocalS3Client
+            app.config['S3_LOCAL_ROOT'] = os.path.join(scratch_dir, 's3')
+        return S3Storage(app.config.get('S3_BUCKET'), app.config.get('S3_LOCATION'))
+    raise ValueError(f"Unknown backend: {name}")
+
+def run(backend, files, size, threads):
+    """:return: (upload seconds, delete seconds)"""
+    payload = os.urandom(size)
+    keys = [f"benchmark/{uuid.uuid4().hex}.bin" for _ in range(files)]
+
+    def upload(key):
+        with app.app_context():
+            return backend.put(io.BytesIO(payload), key, 'application/octet-stream')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        urls = list(pool.map(upload, keys))
+    uploaded = time.perf_counter() - started
+
+    started = time.perf_counter()
+    backend.delete(*urls)
+    deleted = time.perf_counter() - started
+    return uploaded, deleted
+
+def benchmark(backends, files, size_kb, threads, real_s3=False):
+    size = size_kb * 1024
+    print(f"{files} files x {size_kb} KB, {threads} threads")
+    print(f"{'backend':<10}{'files/s':>12}{'MB/s':>10}{'delete/s':>12}")
+    for name in backends:
+        scratch_dir = tempfile.mkdtemp(prefix='storage-bench-')
+        try:
+            backend = make_backend(name, scratch_dir, real_s3)
+            uploaded, deleted = run(backend, files, size, threads)
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+        print(f"{name:<10}{files / uploaded:>12.0f}{files * size / uploaded / 1e6:>10.1f}"
+              f"{files / deleted if deleted else float('inf'):>12.0f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark storage backends')
+    parser.add_argument('--backends', nargs='+', default=['memory', 'local', 's3'],
+                        choices=['memory', 'local', 's3'])
+    parser.add_argument('--files', type=int, default=200, help='objects to upload per backend')
+    parser.add_argument('--size', type=int, default=256, help='object size in KB')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent uploads')
+    parser.add_argument('--real-s3', action='store_true', help='use the configured bucket instead of a stand-in')
+    args = parser.parse_args()
+
+    with app.app_context():
+        benchmark(args.backends, args.files, args.size, args.threads, real_s3=args.real_s3)
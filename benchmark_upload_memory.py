@@ -0,0 +1,104 @@
+# benchmark_upload_memory.py
+#
+# Peak memory of processing one uploaded image, old path vs streaming path.
+#
+#   python benchmark_upload_memory.py                    # synthetic 6000x4000 JPEG
+#   python benchmark_upload_memory.py photo.jpg scan.png
+#
+# "buffered" is how uploads used to be handled: the whole upload read into
+# memory, thumbnailed (Pillow's default reducing_gap already decodes JPEGs
+# at a reduced scale, just not as far down), then re-encoded into a
+# BytesIO. "streaming" is what
+# the image pipeline does: process_image() on the staged file, JPEGs decoded
+# at reduced scale via draft(), output written to a file on disk. Each run
+# happens in a fresh process so peak RSS is measured per upload.
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from PIL import Image
+
+def _status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+
+def rss_mb():
+    """(current RSS, peak RSS) in MB"""
+    if os.path.exists('/proc/self/status'):
+        return _status_mb('VmRSS'), _status_mb('VmHWM')
+    # ru_maxrss is in KB on Linux, bytes on macOS; without /proc only the peak is known
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    return rss, rss
+
+def reset_peak():
+    """Start the peak RSS high-water mark from the current RSS (Linux)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def buffered(path):
+    # The old upload_file_to_s3 handler, step for step
+    with open(path, 'rb') as f:
+        data = io.BytesIO(f.read())
+    filename = os.path.basename(path)
+    img = Image.open(data)
+    img.thumbnail((1200, 900), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    original_format = img.format
+    if original_format == 'JPEG' or filename.lower().endswith(('.jpg', '.jpeg')):
+        img.save(output, format='JPEG', quality=95, optimize=True)
+    elif original_format == 'PNG' or filename.lower().endswith('.png'):
+        img.save(output, format='PNG', optimize=True)
+    else:
+        img.save(output, format='JPEG', quality=95, optimize=True)
+    return output.tell()
+
+def streaming(path):
+    from app.utils.s3_helper import process_image
+    with tempfile.TemporaryDirectory() as staging:
+        output_path = os.path.join(staging, 'output')
+        process_image(path, os.path.basename(path), output_path)
+        return os.path.getsize(output_path)
+
+def measure(strategy, path, results):
+    import app.utils.s3_helper  # noqa: F401 -- imported up front so it isn't counted
+    reset_peak()
+    before, _ = rss_mb()
+    started = time.perf_counter()
+    size = globals()[strategy](path)
+    results.put((rss_mb()[1] - before, time.perf_counter() - started, size))
+
+def run(strategy, path):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=measure, args=(strategy, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main(paths):
+    if not paths:
+        path = os.path.join(tempfile.gettempdir(), 'upload-memory-benchmark.jpg')
+        if not os.path.exists(path):
+            Image.effect_noise((6000, 4000), 64).convert('RGB').save(path, quality=92)
+        paths = [path]
+
+    print(f"{'image':<32}{'strategy':<12}{'peak RSS +MB':>14}{'seconds':>10}{'output KB':>11}")
+    for path in paths:
+        with Image.open(path) as img:
+            label = f"{os.path.basename(path)[:20]} {img.width}x{img.height}"
+        for strategy in ('buffered', 'streaming'):
+            rss, seconds, size = run(strategy, path)
+            print(f"{label:<32}{strategy:<12}{rss:>14.1f}{seconds:>10.2f}{size / 1024:>11.0f}")
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,54 @@
+# build_eta_tables.py
+#
+# Load bus routes/stops and precompute stop-to-stop travel times from the
+# recorded position history. Run it from cron (e.g. nightly):
+#
+#   python build_eta_tables.py                 # rebuild travel times only
+#   python build_eta_tables.py routes.json     # load/replace routes first
+#
+# routes.json is a list of routes:
+#   [{"name": "Campus Loop", "is_loop": true,
+#     "path": [[6.67233, -1.56927], ...],
+#     "stops": [{"name": "Commercial Area", "lat": 6.6747, "lng": -1.5672}, ...]}]
+import json
+import sys
+import time
+from app import create_app, db
+from app.models import BusRoute, BusStop
+from app.utils.eta import rebuild_segment_times
+from app.utils.position_history import encode_polyline
+
+app = create_app()
+
+def load_routes(path):
+    with open(path) as f:
+        routes = json.load(f)
+
+    for data in routes:
+        route = BusRoute.query.filter_by(name=data['name']).first()
+        if route is None:
+            route = BusRoute(name=data['name'])
+            db.session.add(route)
+
+        route.is_loop = data.get('is_loop', False)
+        route.path = ''.join(encode_polyline(
+            (round(lat * 1e5), round(lng * 1e5)) for lat, lng in data['path']
+        ))
+
+        # Replace the stops; travel times are recomputed below
+        route.stops = [
+            BusStop(name=stop['name'], latitude=stop['lat'], longitude=stop['lng'], sequence=i)
+            for i, stop in enumerate(data['stops'])
+        ]
+        print(f"Loaded route {route.name} with {len(route.stops)} stops")
+
+    db.session.commit()
+
+if __name__ == '__main__':
+    with app.app_context():
+        if len(sys.argv) > 1:
+            load_routes(sys.argv[1])
+
+        started = time.time()
+        updated = rebuild_segment_times(days=app.config['ETA_HISTORY_DAYS'])
+        print(f"Updated travel times for {updated} stops in {time.time() - started:.1f}s")
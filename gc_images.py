@@ -0,0 +1,135 @@
+# gc_images.py
+#
+# Delete stored images that no row refers to any more: files left behind by
+# failed or interrupted deletes, replaced uploads, or legacy local uploads.
+#
+#   python gc_images.py --dry-run              # list orphans only
+#   python gc_images.py                        # delete them
+#   python gc_images.py --rate 200 --min-age 48
+#
+# Every image_file value (and every derivative of a live image asset) is
+# streamed from the database into a set of storage keys. Storage is then
+# listed page by page and orphans are deleted in batches as they are found,
+# so memory grows with the number of referenced images, never with the
+# size of the bucket. Files younger than --min-age hours are left alone, as
+# they may belong to an upload that is still being saved.
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from app import create_app, db
+from app.models import BlogPost, Event, PersonalityOfTheWeek, HomeBanner, GalleryPhoto, FohContestant, ImageAsset
+from app.utils.storage import get_storage
+
+app = create_app()
+
+# Models with an image_file column, and the static folders their bare (legacy) filenames live in
+IMAGE_MODELS = [
+    (BlogPost, ['blog_pics']),
+    (Event, ['event_pics', 'uploads/event_pics']),
+    (PersonalityOfTheWeek, ['potw_pics']),
+    (HomeBanner, ['banners', 'uploads/banners']),
+    (GalleryPhoto, ['uploads/gallery']),
+    (FohContestant, ['foh_pics']),
+]
+
+# Storage prefixes uploads are written under; nothing outside them is touched
+IMAGE_PREFIXES = ['blog_pics/', 'event_pics/', 'potw_pics/', 'banners/', 'foh_pics/',
+                  'uploads/gallery/', 'uploads/banners/', 'uploads/event_pics/']
+
+def referenced_keys(storage, chunk_size=1000):
+    """Storage keys of every image still in use"""
+    keys = set()
+
+    def add(value, folders):
+        key = storage.key_for(value)
+        if key:
+            keys.add(key)
+        elif '://' not in value and not value.startswith('/'):
+            # A bare filename from before URLs were stored
+            keys.update(f"{folder}/{value}" for folder in folders)
+
+    for model, folders in IMAGE_MODELS:
+        stmt = select(model.image_file).where(model.image_file.isnot(None)) \
+            .execution_options(stream_results=True, yield_per=chunk_size)
+        for (value,) in db.session.execute(stmt):
+            add(value, folders)
+
+    stmt = select(ImageAsset.key, ImageAsset.folder, ImageAsset.derivatives) \
+        .where(ImageAsset.ref_count > 0) \
+        .execution_options(stream_results=True, yield_per=chunk_size)
+    for key, folder, derivatives in db.session.execute(stmt):
+        add(key, [folder])
+        for _, _, variant in json.loads(derivatives) if derivatives else []:
+            add(variant, [folder])
+    return keys
+
+def find_orphans(storage, referenced, min_age):
+    """Yield (key, size) of unreferenced files older than min_age, listing storage lazily"""
+    cutoff = datetime.now(timezone.utc) - min_age
+    for prefix in IMAGE_PREFIXES:
+        for key, size, modified in storage.list(prefix):
+            if key in referenced or modified > cutoff:
+                continue
+            # Default images are referenced from templates rather than rows
+            if os.path.basename(key).startswith('default_'):
+                continue
+            yield key, size
+
+def collect(dry_run=False, batch_size=500, rate=100.0, min_age_hours=24):
+    """
+    :param batch_size: Keys per delete request (S3 allows up to 1000)
+    :param rate: Maximum deletes per second
+    :return: Number of orphans found
+    """
+    started = time.time()
+    storage = get_storage()
+    print(f"Collecting orphaned images in {type(storage).__name__}{' (dry run)' if dry_run else ''}...")
+    referenced = referenced_keys(storage)
+    print(f"{len(referenced)} referenced keys loaded in {time.time() - started:.1f}s")
+
+    found = found_bytes = deleted = 0
+    batch = []
+
+    def flush():
+        nonlocal deleted
+        batch_started = time.time()
+        storage.delete_keys(batch)
+        deleted += len(batch)
+        # Spread deletes out so a large cleanup doesn't crowd out live traffic
+        pause = len(batch) / rate - (time.time() - batch_started) if rate else 0
+        if pause > 0:
+            time.sleep(pause)
+        batch.clear()
+
+    for key, size in find_orphans(storage, referenced, timedelta(hours=min_age_hours)):
+        found += 1
+        found_bytes += size
+        if dry_run:
+            print(f"  orphan: {key} ({size / 1024:.0f} KB)")
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            flush()
+            print(f"  deleted {deleted} orphans so far")
+    if batch:
+        flush()
+
+    elapsed = time.time() - started
+    action = "would be deleted" if dry_run else "deleted"
+    print(f"{found} orphans ({found_bytes / 1e6:.1f} MB) {action} in {elapsed:.1f}s")
+    return found
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Delete stored images no row refers to')
+    parser.add_argument('--dry-run', action='store_true', help='list orphans without deleting them')
+    parser.add_argument('--batch-size', type=int, default=500, help='keys per delete call (max 1000)')
+    parser.add_argument('--rate', type=float, default=100.0, help='maximum deletes per second (0 for no limit)')
+    parser.add_argument('--min-age', type=float, default=24, help='only delete files older than this many hours')
+    args = parser.parse_args()
+
+    with app.app_context():
+        collect(dry_run=args.dry_run, batch_size=min(args.batch_size, 1000), rate=args.rate,
+                min_age_hours=args.min_age)
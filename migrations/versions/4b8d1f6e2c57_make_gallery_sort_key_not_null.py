@@ -0,0 +1,43 @@
+"""Make the gallery sort key NOT NULL
+
+Revision ID: 4b8d1f6e2c57
+Revises: 7c1f4e9a2d36
+Create Date: 2026-10-18 10:12:31.604218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8d1f6e2c57'
+down_revision = '7c1f4e9a2d36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Photos saved before these columns were filled in; a NULL in the sort
+    # key can't be encoded into a pagination cursor
+    op.execute('UPDATE gallery_photo SET "order" = 0 WHERE "order" IS NULL')
+    op.execute('UPDATE gallery_photo SET date_posted = CURRENT_TIMESTAMP WHERE date_posted IS NULL')
+
+    with op.batch_alter_table('gallery_photo', schema=None) as batch_op:
+        batch_op.alter_column('date_posted',
+               existing_type=sa.DateTime(),
+               nullable=False)
+        batch_op.alter_column('order',
+               existing_type=sa.Integer(),
+               nullable=False,
+               server_default='0')
+
+
+def downgrade():
+    with op.batch_alter_table('gallery_photo', schema=None) as batch_op:
+        batch_op.alter_column('order',
+               existing_type=sa.Integer(),
+               nullable=True,
+               server_default=None)
+        batch_op.alter_column('date_posted',
+               existing_type=sa.DateTime(),
+               nullable=True)
@@ -0,0 +1,115 @@
+# reconcile_votes.py
+#
+# Recompute Face of HESA totals from the FohVote rows and fix any drift in
+# the denormalized FohContestant.votes column.
+#
+#   python reconcile_votes.py --dry-run        # report differences only
+#   python reconcile_votes.py                  # report and correct them
+#
+# Verified votes are totalled per contestant by the database in one
+# GROUP BY query, so only one row per contestant comes back however many
+# vote rows there are. Corrections are applied in one transaction; each
+# drifted contestant is locked and re-counted first, so votes verified
+# while the totals were being computed are never lost. Running web workers
+# reload their leaderboard through the shared 'leaderboard' cache tag.
+import argparse
+import time
+from sqlalchemy import case, select
+from app import create_app, db
+from app.models import FohContestant, FohVote
+from app.utils.leaderboard import leaderboard
+
+app = create_app()
+
+def count_votes():
+    """
+    Total verified votes per contestant with a single GROUP BY
+    :return: ({contestant_id: votes}, rows counted, {problem: count})
+    """
+    stmt = select(
+        FohVote.contestant_id,
+        db.func.coalesce(db.func.sum(FohVote.votes_count), 0),
+        db.func.count(),
+        db.func.sum(case((db.func.coalesce(FohVote.votes_count, 0) < 1, 1), else_=0))
+    ).where(FohVote.verified.is_(True)).group_by(FohVote.contestant_id)
+
+    totals = {}
+    problems = {'non_positive_count': 0}
+    rows = 0
+    for contestant_id, votes, count, non_positive in db.session.execute(stmt):
+        totals[contestant_id] = votes
+        rows += count
+        problems['non_positive_count'] += non_positive or 0
+    return totals, rows, problems
+
+def find_drift(totals):
+    """Contestants whose stored total differs from the counted one: [(id, name, stored, counted)]"""
+    drift = []
+    for contestant_id, name, stored in db.session.query(FohContestant.id, FohContestant.name, FohContestant.votes):
+        counted = totals.get(contestant_id, 0)
+        if (stored or 0) != counted:
+            drift.append((contestant_id, name, stored or 0, counted))
+    return drift
+
+def apply_corrections(contestant_ids):
+    """
+    Set each contestant's total to its verified vote count, in one transaction.
+    The contestant row is locked before counting, so a vote verified
+    concurrently is either included in the count or incremented afterwards.
+    :return: Number of contestants corrected
+    """
+    corrected = 0
+    for contestant_id in contestant_ids:
+        contestant = db.session.execute(
+            select(FohContestant).where(FohContestant.id == contestant_id).with_for_update()
+        ).scalar_one_or_none()
+        if contestant is None:
+            continue
+        counted = db.session.execute(
+            select(db.func.coalesce(db.func.sum(FohVote.votes_count), 0))
+            .where(FohVote.contestant_id == contestant_id, FohVote.verified.is_(True))
+        ).scalar()
+        if contestant.votes != counted:
+            contestant.votes = counted
+            corrected += 1
+    db.session.commit()
+    return corrected
+
+def reconcile(dry_run=False):
+    started = time.time()
+    print("Counting verified votes...")
+    totals, rows, problems = count_votes()
+    print(f"Counted {rows} verified votes for {len(totals)} contestants in {time.time() - started:.1f}s")
+
+    known = {contestant_id for (contestant_id,) in db.session.query(FohContestant.id)}
+    orphaned = sum(1 for contestant_id in totals if contestant_id not in known)
+    if orphaned:
+        print(f"Warning: verified votes reference {orphaned} deleted contestant(s)")
+    if problems['non_positive_count']:
+        print(f"Warning: {problems['non_positive_count']} verified vote(s) have no votes_count")
+
+    drift = find_drift(totals)
+    if not drift:
+        print("All contestant totals match their verified votes")
+        return 0
+
+    for contestant_id, name, stored, counted in drift:
+        print(f"  {name} (id {contestant_id}): stored {stored}, counted {counted} ({counted - stored:+d})")
+
+    if dry_run:
+        print(f"Dry run: {len(drift)} contestant(s) would be corrected")
+        return len(drift)
+
+    corrected = apply_corrections([contestant_id for contestant_id, _, _, _ in drift])
+    # Bumps the shared tag, so web workers reload within CACHE_TAG_CHECK_INTERVAL
+    leaderboard.invalidate()
+    print(f"Corrected {corrected} contestant(s) in {time.time() - started:.1f}s")
+    return corrected
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reconcile Face of HESA vote totals')
+    parser.add_argument('--dry-run', action='store_true', help='report differences without fixing them')
+    args = parser.parse_args()
+
+    with app.app_context():
+        reconcile(dry_run=args.dry_run)
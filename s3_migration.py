@@ -1,116 +1,195 @@
 # s3_migration.py
+#
+# Move locally stored images to S3 and point their rows at the new URLs.
+#
+#   python s3_migration.py --dry-run           # list what would be moved
+#   python s3_migration.py                     # migrate (re-run to resume)
+#   python s3_migration.py --workers 16 --batch-size 200
+#
+# Covers blog posts, events, personalities, banners, gallery photos and
+# Face of HESA contestants, plus the responsive derivatives of any image
+# processed by the image pipeline. Files were already resized when they
+# were uploaded, so they are copied as they are (not re-encoded), from a
+# thread pool. Rows are updated in batches; every finished upload is
+# appended to a checkpoint file first, so an interrupted run picks up
+# where it stopped without uploading anything twice.
+import argparse
+import json
+import mimetypes
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from app import create_app, db
-from app.models import BlogPost, Event, PersonalityOfTheWeek
-from app.utils.s3_helper import upload_file_to_s3
-from werkzeug.datastructures import FileStorage
+from app.models import BlogPost, Event, PersonalityOfTheWeek, HomeBanner, GalleryPhoto, FohContestant, ImageAsset
+from app.utils.storage import S3Storage
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Debug: Print environment variables (redacted for security)
-print(f"AWS_ACCESS_KEY_ID: {'*****' if os.environ.get('AWS_ACCESS_KEY_ID') else 'Not set'}")
-print(f"AWS_SECRET_ACCESS_KEY: {'*****' if os.environ.get('AWS_SECRET_ACCESS_KEY') else 'Not set'}")
-print(f"S3_BUCKET: {os.environ.get('S3_BUCKET')}")
-print(f"AWS_REGION: {os.environ.get('AWS_REGION')}")
-print(f"USE_S3: {os.environ.get('USE_S3')}")
-
-# Set AWS credentials if not already present in environment
-# (These would normally be in your .env file)
-if not os.environ.get('AWS_ACCESS_KEY_ID'):
-    os.environ['AWS_ACCESS_KEY_ID'] = 'your_access_key_here'  # Replace with your actual key
-if not os.environ.get('AWS_SECRET_ACCESS_KEY'):
-    os.environ['AWS_SECRET_ACCESS_KEY'] = 'your_secret_key_here'  # Replace with your actual key
-if not os.environ.get('S3_BUCKET'):
-    os.environ['S3_BUCKET'] = 'knust-hesa-images'
-if not os.environ.get('AWS_REGION'):
-    os.environ['AWS_REGION'] = 'us-east-1'  # or your actual region
-if not os.environ.get('USE_S3'):
-    os.environ['USE_S3'] = 'True'
-
 app = create_app()
 
-def migrate_images_to_s3():
+# (model, storage folder, static folders legacy files may be in, default images to leave alone)
+SOURCES = [
+    (BlogPost, 'blog_pics', ['blog_pics'], {'default_blog.jpg', 'default_blog.jpeg'}),
+    (Event, 'event_pics', ['event_pics', 'uploads/event_pics'], set()),
+    (PersonalityOfTheWeek, 'potw_pics', ['potw_pics'], {'default_potw.jpg'}),
+    (HomeBanner, 'banners', ['banners', 'uploads/banners'], set()),
+    (GalleryPhoto, 'uploads/gallery', ['uploads/gallery'], set()),
+    (FohContestant, 'foh_pics', ['foh_pics'], {'default_contestant.jpg'}),
+]
+
+def local_path(value, folders):
+    """Path of a locally stored image ('/static/...' URL or bare filename), or None"""
+    static_url = app.static_url_path + '/'
+    if value.startswith(static_url):
+        candidates = [os.path.join(app.static_folder, value[len(static_url):])]
+    elif '://' in value or value.startswith('/'):
+        return None
+    else:
+        candidates = [os.path.join(app.static_folder, folder, value) for folder in folders]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return candidates[0]
+
+def plan_jobs(done):
+    """
+    Find every row still pointing at a local image
+    :param done: Checkpointed uploads, {job id: {old value: new URL}}
+    :return: (jobs, rows whose file is missing)
+    """
+    assets = {asset.key: asset for asset in ImageAsset.query.filter(ImageAsset.status == 'ready')}
+    jobs, missing = [], []
+    for model, folder, folders, defaults in SOURCES:
+        for row_id, value in db.session.query(model.id, model.image_file).order_by(model.id):
+            if not value or value in defaults or local_path(value, folders) is None:
+                continue
+            path = local_path(value, folders)
+            if not os.path.isfile(path):
+                missing.append((model.__name__, row_id, path))
+                continue
+
+            # The image itself, then any derivatives recorded for it
+            files = [(value, path, f"{folder}/{os.path.basename(path)}", mimetypes.guess_type(path)[0])]
+            asset = assets.get(value)
+            for width, mime, key in json.loads(asset.derivatives or '[]') if asset else []:
+                variant_path = local_path(key, [asset.folder])
+                if key != value and variant_path and os.path.isfile(variant_path):
+                    files.append((key, variant_path, f"{folder}/{os.path.basename(variant_path)}", mime))
+
+            job_id = f"{model.__name__}:{row_id}"
+            jobs.append({'id': job_id, 'model': model, 'row_id': row_id, 'value': value,
+                         'asset_id': asset.id if asset else None, 'files': files,
+                         'done': done.get(job_id, {})})
+    return jobs, missing
+
+def upload_job(storage, job):
+    """Upload a job's files (skipping any already checkpointed): {old value: new URL}"""
+    urls = dict(job['done'])
     with app.app_context():
-        print("Starting migration of images to S3...")
-        
-        # Migrate blog post images
-        posts = BlogPost.query.all()
-        print(f"Found {len(posts)} blog posts to migrate")
-        
-        for post in posts:
-            if post.image_file and post.image_file != 'default_blog.jpg' and not post.image_file.startswith('http'):
-                file_path = os.path.join(app.root_path, 'static', 'blog_pics', post.image_file)
-                if os.path.exists(file_path):
-                    print(f"Migrating blog post image: {post.image_file}")
-                    with open(file_path, 'rb') as file_data:
-                        # Convert to FileStorage object which is what upload_file_to_s3 expects
-                        file_storage = FileStorage(
-                            stream=file_data,
-                            filename=os.path.basename(file_path),
-                            content_type='image/jpeg'  # Adjust if needed
-                        )
-                        s3_url = upload_file_to_s3(file_storage, 'blog_pics', acl=None)  # Note: acl=None for S3 buckets with ACLs disabled
-                        if s3_url:
-                            post.image_file = s3_url
-                            print(f"  → Migrated to {s3_url}")
-                        else:
-                            print(f"  → Failed to migrate {post.image_file}")
-                else:
-                    print(f"Warning: Image file not found: {file_path}")
-        
-        # Migrate event images
-        events = Event.query.all()
-        print(f"Found {len(events)} events to migrate")
-        
-        for event in events:
-            if event.image_file and not event.image_file.startswith('http'):
-                file_path = os.path.join(app.root_path, 'static', 'event_pics', event.image_file)
-                if os.path.exists(file_path):
-                    print(f"Migrating event image: {event.image_file}")
-                    with open(file_path, 'rb') as file_data:
-                        file_storage = FileStorage(
-                            stream=file_data,
-                            filename=os.path.basename(file_path),
-                            content_type='image/jpeg'  # Adjust if needed
-                        )
-                        s3_url = upload_file_to_s3(file_storage, 'event_pics', acl=None)
-                        if s3_url:
-                            event.image_file = s3_url
-                            print(f"  → Migrated to {s3_url}")
-                        else:
-                            print(f"  → Failed to migrate {event.image_file}")
-                else:
-                    print(f"Warning: Image file not found: {file_path}")
-        
-        # Migrate POTW images
-        potws = PersonalityOfTheWeek.query.all()
-        print(f"Found {len(potws)} personalities to migrate")
-        
-        for potw in potws:
-            if potw.image_file and not potw.image_file.startswith('http'):
-                file_path = os.path.join(app.root_path, 'static', 'potw_pics', potw.image_file)
-                if os.path.exists(file_path):
-                    print(f"Migrating POTW image: {potw.image_file}")
-                    with open(file_path, 'rb') as file_data:
-                        file_storage = FileStorage(
-                            stream=file_data,
-                            filename=os.path.basename(file_path),
-                            content_type='image/jpeg'  # Adjust if needed
-                        )
-                        s3_url = upload_file_to_s3(file_storage, 'potw_pics', acl=None)
-                        if s3_url:
-                            potw.image_file = s3_url
-                            print(f"  → Migrated to {s3_url}")
-                        else:
-                            print(f"  → Failed to migrate {potw.image_file}")
-                else:
-                    print(f"Warning: Image file not found: {file_path}")
-        
-        # Save all changes to database
-        db.session.commit()
-        print("Migration complete!")
+        for value, path, key, content_type in job['files']:
+            if value not in urls:
+                with open(path, 'rb') as f:
+                    urls[value] = storage.put(f, key, content_type or 'application/octet-stream')
+    return urls
+
+def apply_batch(batch):
+    """Point a batch of rows (and their image assets) at their new URLs, in one transaction"""
+    for job, urls in batch:
+        job['model'].query.filter_by(id=job['row_id'], image_file=job['value']) \
+            .update({'image_file': urls[job['value']]})
+        if job['asset_id'] is not None:
+            asset = db.session.get(ImageAsset, job['asset_id'])
+            manifest = json.loads(asset.derivatives or '[]')
+            asset.derivatives = json.dumps([[w, mime, urls.get(key, key)] for w, mime, key in manifest],
+                                           separators=(',', ':'))
+            asset.key = urls[job['value']]
+    db.session.commit()
+
+def load_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    done.setdefault(entry['job'], {}).update(entry['urls'])
+    return done
+
+def migrate(dry_run=False, workers=8, batch_size=100, checkpoint='s3_migration.checkpoint', acl=None):
+    started = time.time()
+    done = load_checkpoint(checkpoint)
+    jobs, missing = plan_jobs(done)
+    for model_name, row_id, path in missing:
+        print(f"Warning: {model_name} {row_id}: image file not found: {path}")
+
+    total_files = sum(len(job['files']) for job in jobs)
+    total_bytes = sum(os.path.getsize(path) for job in jobs for _, path, _, _ in job['files'])
+    by_model = {}
+    for job in jobs:
+        by_model[job['model'].__name__] = by_model.get(job['model'].__name__, 0) + 1
+    print(f"{len(jobs)} rows to migrate ({total_files} files, {total_bytes / 1e6:.1f} MB), "
+          f"{len(missing)} missing files, {sum(map(len, done.values()))} uploads checkpointed")
+    for model_name, count in by_model.items():
+        print(f"  {model_name}: {count}")
+
+    if dry_run or not jobs:
+        return 0
+
+    storage = S3Storage(app.config.get('S3_BUCKET'), app.config.get('S3_LOCATION'), acl=acl)
+    migrated = failed = uploaded_bytes = 0
+    batch = []
+    last_report = time.time()
+    with open(checkpoint, 'a') as log, ThreadPoolExecutor(workers) as pool:
+        futures = {pool.submit(upload_job, storage, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                urls = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  Failed {job['id']} ({job['value']}): {e}")
+                continue
+
+            # Record the uploads before the rows, so a crash never loses track of them
+            log.write(json.dumps({'job': job['id'], 'urls': urls}) + '\n')
+            log.flush()
+            uploaded_bytes += sum(os.path.getsize(path) for _, path, _, _ in job['files'])
+            batch.append((job, urls))
+            if len(batch) >= batch_size:
+                apply_batch(batch)
+                migrated += len(batch)
+                batch = []
+
+            now = time.time()
+            if now - last_report >= 5:
+                last_report = now
+                elapsed = now - started
+                print(f"  {migrated + len(batch)}/{len(jobs)} rows, "
+                      f"{uploaded_bytes / elapsed / 1e6:.1f} MB/s")
+        if batch:
+            apply_batch(batch)
+            migrated += len(batch)
+
+    elapsed = time.time() - started
+    print(f"Migrated {migrated} rows ({uploaded_bytes / 1e6:.1f} MB) in {elapsed:.1f}s "
+          f"({migrated / elapsed:.1f} rows/s, {uploaded_bytes / elapsed / 1e6:.1f} MB/s), {failed} failed")
+    if not failed and os.path.exists(checkpoint):
+        # Every upload is reflected in the database now
+        os.remove(checkpoint)
+    return migrated
 
 if __name__ == "__main__":
-    migrate_images_to_s3()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Migrate local images to S3')
+    parser.add_argument('--dry-run', action='store_true', help='list what would be migrated')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent uploads')
+    parser.add_argument('--batch-size', type=int, default=100, help='rows updated per commit')
+    parser.add_argument('--checkpoint', default='s3_migration.checkpoint', help='resume file')
+    parser.add_argument('--acl', default=None,
+                        help="object ACL, e.g. public-read (default none, for buckets with ACLs disabled)")
+    args = parser.parse_args()
+
+    with app.app_context():
+        migrate(dry_run=args.dry_run, workers=args.workers, batch_size=args.batch_size,
+                checkpoint=args.checkpoint, acl=args.acl)
@@ -0,0 +1,109 @@
+"""
+Query plan regression tests: every hot route query must be answered from an
+index. Each query is run through SQLite's EXPLAIN QUERY PLAN against a fresh
+schema built from the models; a plan that scans a whole table, or sorts rows
+in a temporary B-tree, fails the test. Walking an index in order under a
+LIMIT (SCAN ... USING INDEX) is allowed: it stops after one page.
+"""
+import re
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+from app import create_app, db
+from app.config import Config
+from app.models import (BlogPost, Comment, PotwComment, Event, BusLocation, HomeBanner, GalleryPhoto,
+                        FohContestant, FohVote)
+from app.routes import GALLERY_ORDER
+from app.utils.pagination import _after
+
+
+class QueryPlanConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    STORAGE_BACKEND = 'memory'
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app(QueryPlanConfig)
+    with app.app_context():
+        yield app
+
+
+def query_plan(statement):
+    """EXPLAIN QUERY PLAN details for a query or select(), one string per step"""
+    statement = getattr(statement, 'statement', statement)
+    sql = str(statement.compile(dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def assert_uses_index(statement, index):
+    plan = query_plan(statement)
+    full_scans = [step for step in plan if re.fullmatch(r'SCAN \w+', step)]
+    assert not full_scans, f"full table scan: {plan}"
+    assert not any('TEMP B-TREE' in step for step in plan), f"sorts without an index: {plan}"
+    assert any(index in step for step in plan), f"{index} not used: {plan}"
+
+
+# (index that must answer the query, the query as the routes build it)
+HOT_QUERIES = {
+    'blog index by date': (
+        'ix_blog_post_date_posted_id',
+        lambda: BlogPost.query.filter(BlogPost.category.notin_(['health', 'event']))
+        .order_by(BlogPost.date_posted.desc(), BlogPost.id.desc()).limit(10)),
+    'blog category by date': (
+        'ix_blog_post_category_date_posted',
+        lambda: BlogPost.query.filter_by(category='health').order_by(BlogPost.date_posted.desc())),
+    'post comments': (
+        'ix_comment_post_id_date_posted',
+        lambda: Comment.query.filter_by(post_id=1).order_by(Comment.date_posted.desc())),
+    'potw comments': (
+        'ix_potw_comment_potw_id_date_posted',
+        lambda: PotwComment.query.filter_by(potw_id=1).order_by(PotwComment.date_posted.desc())),
+    'latest events': (
+        'ix_event_event_date',
+        lambda: Event.query.order_by(Event.event_date.desc()).limit(3)),
+    'bus by bus_id': (
+        'ix_bus_location_bus_id',
+        lambda: BusLocation.query.filter_by(bus_id='HESA-1')),
+    'buses by driver': (
+        'ix_bus_location_driver_id',
+        lambda: BusLocation.query.filter_by(driver_id=1)),
+    'active banners': (
+        'ix_home_banner_is_active_order',
+        lambda: HomeBanner.query.filter_by(is_active=True).order_by(HomeBanner.order).limit(3)),
+    'vote by transaction_ref': (
+        'ix_foh_vote_transaction_ref',
+        lambda: FohVote.query.filter_by(transaction_ref='T123')),
+    'active contestants': (
+        'ix_foh_contestant_is_active_votes',
+        lambda: select(FohContestant.id, FohContestant.votes).filter_by(is_active=True)
+        .order_by(FohContestant.votes.desc())),
+}
+
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_query_uses_index(app, name):
+    index, build = HOT_QUERIES[name]
+    assert_uses_index(build(), index)
+
+
+def gallery_query(category_id=None, cursor=None):
+    # The query gallery_page() hands to keyset_paginate, for one page
+    query = GalleryPhoto.query.filter(GalleryPhoto.is_active.is_(True))
+    if category_id is not None:
+        query = query.filter(GalleryPhoto.category_id == category_id)
+    if cursor is not None:
+        query = query.filter(_after(GALLERY_ORDER, cursor))
+    order = [column.desc() if desc else column.asc() for column, desc in GALLERY_ORDER]
+    return query.order_by(*order).limit(25)
+
+
+@pytest.mark.parametrize('cursor', [None, [0, '2026-01-01 00:00:00', 10]], ids=['first page', 'next page'])
+def test_gallery_page_uses_index(app, cursor):
+    assert_uses_index(gallery_query(cursor=cursor), 'ix_gallery_photo_active_order')
+
+
+@pytest.mark.parametrize('cursor', [None, [0, '2026-01-01 00:00:00', 10]], ids=['first page', 'next page'])
+def test_gallery_category_page_uses_index(app, cursor):
+    assert_uses_index(gallery_query(category_id=1, cursor=cursor), 'ix_gallery_photo_category_order')